@@ -0,0 +1 @@
+"""Benchmarks for corpusama operations run on synthetic ReliefWeb data."""
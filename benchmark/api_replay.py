@@ -0,0 +1,81 @@
+"""Profiles a ReliefWeb harvest replayed from recorded API responses.
+
+Synthetic `/reports` pages are saved to a `call.ResponseCache` (as if recorded), then
+`ReliefWeb.get_all_records` replays them into a new database under `cProfile`. No
+network access or quota is used. Run from the repository root:
+
+    python -m benchmark.api_replay --records 20000 --limit 1000 --timing 0
+"""
+
+import cProfile
+import pathlib
+import pstats
+import tempfile
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database.database import Database
+from corpusama.source.call import ResponseCache
+from corpusama.source.reliefweb import ReliefWeb
+from corpusama.testing import synthetic
+from corpusama.util import io as _io
+
+# methods reported from the profile (`_request` runs in another thread with
+# `--prefetch` and isn't profiled)
+methods = ["_request", "_insert", "_insert_log", "_insert_pdf", "insert"]
+modules = ["call.py", "reliefweb.py", "database.py"]
+
+
+def record(cache: ResponseCache, params: dict, records: int, seconds: float) -> None:
+    """Saves synthetic responses for each `offset` of a harvest (and the last)."""
+    limit = params["limit"]
+    for offset in range(0, records + 1, limit):
+        n = min(limit, records - offset)
+        data = synthetic.records(n, offset + 1)
+        response = {"time": 1, "totalCount": records, "count": n, "data": data}
+        cache.save(params | {"offset": offset}, response, seconds)
+
+
+def profile_stats(profile: cProfile.Profile) -> pd.DataFrame:
+    """Returns calls and cumulative seconds for `methods`."""
+    stats = pstats.Stats(profile).stats
+    rows = []
+    for (file, _, name), (_, calls, _, cumulative, _) in stats.items():
+        if name in methods and pathlib.Path(file).name in modules:
+            rows.append({"method": name, "calls": calls, "seconds": cumulative})
+    return pd.DataFrame(rows).sort_values("seconds", ascending=False)
+
+
+@click.command()
+@click.option("--records", default=20000, show_default=True, help="Records to harvest.")
+@click.option("--limit", default=1000, show_default=True, help="Records per call.")
+@click.option("--seconds", default=1.0, show_default=True, help="Recorded call time.")
+@click.option("--timing", default=0.0, show_default=True, help="Replay time factor.")
+@click.option("--prefetch", is_flag=True, help="Prefetch the next page.")
+def main(records: int, limit: int, seconds: float, timing: float, prefetch: bool):
+    """Replays a synthetic harvest and profiles database insertion."""
+    with tempfile.TemporaryDirectory() as tmp:
+        params = _io.load_yaml("test/config-example.yml")["parameters"]
+        params |= {"limit": limit, "offset": 0}
+        cache = {"dir": f"{tmp}/cache", "mode": "replay", "timing": timing}
+        record(ResponseCache(cache["dir"], "record"), params, records, seconds)
+        config = synthetic.config(tmp, parameters=params, api_cache=cache)
+        job = ReliefWeb(config, Database(config))
+        job._set_wait = lambda manual=None: setattr(job, "wait", 0)
+        profile = cProfile.Profile()
+        t0 = perf_counter()
+        profile.enable()
+        job.get_all_records(prefetch=prefetch)
+        profile.disable()
+        total = perf_counter() - t0
+        n_rows = job.db.c.execute("SELECT COUNT(*) FROM _raw").fetchone()[0]
+        job.db.close_db()
+    click.echo(f"{n_rows} records, {limit} per call: {total:.2f}s")
+    click.echo(f"{n_rows / total:.0f} records/s (prefetch: {prefetch})")
+    click.echo(profile_stats(profile).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmarks compressed storage of `_raw.body_html` (the `compress` config key).
+
+Inserts synthetic `_raw` records with no compression, `lzma`, `zlib` and `zlib` with
+a dictionary trained by `Database.train_dictionary`, then reports the database size
+(after `VACUUM`), a full scan of decompressed `body_html` and `export.export_text`.
+Run from the repository root:
+
+    python -m benchmark.db_compress --rows 5000
+"""
+
+import pathlib
+import tempfile
+from time import perf_counter
+from types import SimpleNamespace
+
+import click
+import pandas as pd
+
+from corpusama.corpus import export
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+from corpusama.util.util import now
+
+# (label, codec, trained dictionary)
+settings = [
+    ("none", "none", False),
+    ("lzma", "lzma", False),
+    ("zlib", "zlib", False),
+    ("zlib+dict", "zlib", True),
+]
+
+
+def setup(tmp: str, rows: int, codec: str, zdict: bool) -> Database:
+    """Returns a database with `rows` records in English, ready to export."""
+    db = Database(synthetic.config(tmp, compress={"_raw.body_html": codec}))
+    df = db._add_missing_columns(synthetic.raw_df(rows), "_raw")
+    if zdict:
+        db.insert(df.head(1000), "_raw")
+        db.train_dictionary()
+        db.insert(df.iloc[1000:], "_raw")
+        db.recompress()
+    else:
+        db.insert(df, "_raw")
+    lang = pd.DataFrame({"id": df["id"], "file_id": 0, "lid": [{"en": 1.0}] * rows})
+    lang["lang_date"] = now()
+    db.insert(db._add_missing_columns(lang, "_lang"), "_lang")
+    attr = pd.DataFrame({"id": df["id"]})
+    attr["doc_tag"] = attr["id"].apply(lambda x: f'<doc id="{x}" file_id="FILE_ID">')
+    db.insert(db._add_missing_columns(attr, "_attr"), "_attr")
+    db.c.execute("VACUUM")
+    return db
+
+
+def run(rows: int, label: str, codec: str, zdict: bool) -> dict:
+    """Returns size and timings for one setting."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = setup(tmp, rows, codec, zdict)
+        size = db.path.stat().st_size
+        stored = "SELECT SUM(length(body_html)) FROM _raw"
+        stored = db.c.execute(stored).fetchone()[0]
+        t0 = perf_counter()
+        q = "SELECT SUM(length(decompress(body_html))) FROM _raw"
+        db.c.execute(q).fetchone()
+        t_scan = perf_counter() - t0
+        pathlib.Path(tmp, "export").mkdir()
+        corp = SimpleNamespace(db=db, config=db.config)
+        t0 = perf_counter()
+        export.export_text(corp, "en", stem=f"{tmp}/export/rw", cores=1)
+        t_export = perf_counter() - t0
+        db.close_db()
+    return {
+        "compress": label,
+        "db MB": size / 1e6,
+        "body_html MB": stored / 1e6,
+        "scan s": t_scan,
+        "export s": t_export,
+    }
+
+
+@click.command()
+@click.option("--rows", default=5000, show_default=True, help="Records inserted.")
+def main(rows: int):
+    """Compares `_raw.body_html` compression settings on synthetic records."""
+    df = pd.DataFrame([run(rows, *x) for x in settings])
+    click.echo(f"{rows} records")
+    click.echo(df.round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
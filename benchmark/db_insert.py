@@ -0,0 +1,60 @@
+"""Benchmarks `Database.insert` with typed and string value conversion.
+
+Inserts synthetic `_raw` pages (as made by `ReliefWeb._insert`) with `typed=True`
+(`convert.to_sql_values`) and `typed=False` (`convert.to_json_or_str` and
+`convert.nan_to_none`). Run from the repository root:
+
+    python -m benchmark.db_insert --pages 10 --rows 1000
+"""
+
+import tempfile
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+
+
+def run_insert(pages: list, typed: bool) -> dict:
+    """Inserts `pages` into a new database and returns throughput."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(synthetic.config(tmp))
+        t0 = perf_counter()
+        for df in pages:
+            db.insert(df, "_raw", typed)
+        seconds = perf_counter() - t0
+        rows = db.c.execute("SELECT COUNT(*) FROM _raw").fetchone()[0]
+        db.close_db()
+    return {
+        "path": "typed" if typed else "strings",
+        "seconds": seconds,
+        "rows/s": rows / seconds,
+    }
+
+
+@click.command()
+@click.option("--pages", default=10, show_default=True, help="Number of pages.")
+@click.option("--rows", default=1000, show_default=True, help="Rows per page.")
+@click.option("--repeat", default=3, show_default=True, help="Runs per path (best).")
+def main(pages: int, rows: int, repeat: int):
+    """Compares `Database.insert` conversion paths on synthetic `_raw` pages."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(synthetic.config(tmp))
+        data = [
+            db._add_missing_columns(synthetic.raw_df(rows, x * rows + 1), "_raw")
+            for x in range(pages)
+        ]
+        db.close_db()
+    results = []
+    for typed in [False, True]:
+        runs = [run_insert(data, typed) for _ in range(repeat)]
+        results.append(min(runs, key=lambda x: x["seconds"]))
+    df = pd.DataFrame(results)
+    click.echo(f"{pages} pages x {rows} rows, {len(data[0].columns)} columns")
+    click.echo(df.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
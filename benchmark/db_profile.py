@@ -0,0 +1,68 @@
+"""Benchmarks insert and read throughput for `Database` connection profiles.
+
+Run from the repository root:
+
+    python -m benchmark.db_profile --rows 20000 --page 1000
+"""
+
+import random
+import tempfile
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database import database
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+
+
+def run_profile(profile: str, pages: list, lookups: int = 5000) -> dict:
+    """Inserts `pages` into a new database with `profile` and times reads."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(synthetic.config(tmp, db_profile=profile))
+        pages = [db._add_missing_columns(df.copy(), "_raw") for df in pages]
+        n_rows = sum([len(x) for x in pages])
+        t0 = perf_counter()
+        for df in pages:
+            db.insert(df, "_raw")
+        t_insert = perf_counter() - t0
+        t0 = perf_counter()
+        db.c.execute("SELECT id, date, body_html FROM _raw").fetchall()
+        t_scan = perf_counter() - t0
+        ids = random.Random(0).choices(range(1, n_rows + 1), k=lookups)
+        t0 = perf_counter()
+        for x in ids:
+            db.c.execute("SELECT * FROM _raw WHERE id = ?", (x,)).fetchone()
+        t_lookup = perf_counter() - t0
+        size = db.path.stat().st_size
+        db.close_db()
+    return {
+        "profile": profile,
+        "insert rows/s": round(n_rows / t_insert),
+        "scan rows/s": round(n_rows / t_scan),
+        "lookup rows/s": round(lookups / t_lookup),
+        "db MB": round(size / 1e6, 1),
+    }
+
+
+@click.command()
+@click.option("--rows", default=20000, show_default=True, help="Rows to insert.")
+@click.option("--page", default=1000, show_default=True, help="Rows per commit.")
+@click.option(
+    "--profile",
+    "profiles",
+    multiple=True,
+    default=list(database.profiles),
+    show_default=True,
+    help="Profiles to compare.",
+)
+def main(rows: int, page: int, profiles: list):
+    """Compares `Database` connection profiles on a synthetic `_raw` table."""
+    pages = [synthetic.raw_df(min(page, rows - x), x + 1) for x in range(0, rows, page)]
+    results = [run_profile(p, pages) for p in profiles]
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
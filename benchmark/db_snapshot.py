@@ -0,0 +1,72 @@
+"""Benchmarks reading `_raw` attributes from Parquet snapshots vs. `pd.read_sql`.
+
+Writes `Database.snapshot` for synthetic `_raw` records over several years, then
+compares reading attribute columns with `pd.read_sql` (and `flatten.dataframe`, as
+`Attribute.make` does) and `snapshot.read`. Also times an incremental refresh after
+one record changes. Requires `pyarrow`. Run from the repository root:
+
+    python -m benchmark.db_snapshot --rows 5000 --years 5
+"""
+
+import tempfile
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database import snapshot
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+from corpusama.util import flatten
+
+columns = ["id", "country", "date", "format", "source", "theme"]
+flat_columns = ["id", "country__iso3", "date__original", "format__name", "year"]
+
+
+def timed(func, *args, **kwargs) -> tuple:
+    """Returns the result and seconds taken by a function call."""
+    t0 = perf_counter()
+    res = func(*args, **kwargs)
+    return res, perf_counter() - t0
+
+
+@click.command()
+@click.option("--rows", default=5000, show_default=True, help="Records inserted.")
+@click.option("--years", default=5, show_default=True, help="Years to spread over.")
+def main(rows: int, years: int):
+    """Compares SQL and Parquet reads of `_raw` attributes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(synthetic.config(tmp))
+        df = db._add_missing_columns(synthetic.raw_df(rows), "_raw")
+        db.insert(df, "_raw")
+        db.c.execute(
+            f"""UPDATE _raw SET date = json_set(date, '$.original',
+            (2000 + id % {years}) || '-06-01')"""
+        )
+        path = f"{tmp}/snapshot"
+        _, t_full = timed(db.snapshot, path, ["_raw"])
+        db.c.execute(
+            "UPDATE _raw SET date = json_set(date, '$.changed', '2100-01-01') "
+            "WHERE id = 1"
+        )
+        _, t_refresh = timed(db.snapshot, path, ["_raw"])
+        q = f"SELECT {', '.join(columns)} FROM _raw"
+        _, t_sql = timed(lambda: flatten.dataframe(pd.read_sql(q, db.conn)))
+        _, t_sql_all = timed(pd.read_sql, "SELECT * FROM _raw", db.conn)
+        _, t_parquet = timed(snapshot.read, path, "_raw", columns=flat_columns)
+        _, t_parquet_all = timed(snapshot.read, path, "_raw")
+        db.close_db()
+    results = [
+        {"step": "snapshot (full)", "seconds": t_full},
+        {"step": "snapshot (1 year changed)", "seconds": t_refresh},
+        {"step": "read_sql + flatten (attributes)", "seconds": t_sql},
+        {"step": "snapshot.read (attributes)", "seconds": t_parquet},
+        {"step": "read_sql (all columns)", "seconds": t_sql_all},
+        {"step": "snapshot.read (all columns)", "seconds": t_parquet_all},
+    ]
+    click.echo(f"{rows} records over {years} years")
+    click.echo(pd.DataFrame(results).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmarks making `_pdf` rows from `_raw` pages in `ReliefWeb._insert_pdf`.
+
+Compares the previous row-by-row transform (`pd.json_normalize` on exploded files and
+`df.iloc` for report ids) with `reliefweb._pdf_rows`. Run from the repository root:
+
+    python -m benchmark.insert_pdf --pages 20 --rows 1000
+"""
+
+import tempfile
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database.database import Database
+from corpusama.source import reliefweb
+from corpusama.testing import synthetic
+
+
+def legacy_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns `_pdf` rows as `_insert_pdf` used to make them."""
+    df = df.loc[df["file"].notna()].copy()
+    df_flat = pd.json_normalize(df["file"].explode())
+    df_flat.rename(columns={"id": "file_id"}, inplace=True)
+    ids = [[df.iloc[x]["id"]] * len(df.iloc[x]["file"]) for x in range(len(df))]
+    df_flat["id"] = [x for y in ids for x in y]
+    return df_flat
+
+
+def run(pages: list, func) -> float:
+    """Returns seconds taken to transform all pages with `func`."""
+    t0 = perf_counter()
+    for df in pages:
+        func(df)
+    return perf_counter() - t0
+
+
+def run_insert(pages: list, config: str) -> float:
+    """Returns seconds taken by `_insert_pdf` (transform and insert) for all pages."""
+    job = reliefweb.ReliefWeb(config, Database(config))
+    t0 = perf_counter()
+    for df in pages:
+        job.df_raw = df
+        job._insert_pdf()
+    seconds = perf_counter() - t0
+    job.db.close_db()
+    return seconds
+
+
+@click.command()
+@click.option("--pages", default=20, show_default=True, help="Number of pages.")
+@click.option("--rows", default=1000, show_default=True, help="Records per page.")
+@click.option("--max-files", default=2, show_default=True, help="Files per record.")
+def main(pages: int, rows: int, max_files: int):
+    """Compares `_pdf` row transforms on synthetic API pages."""
+    data = [
+        synthetic.raw_df(rows, x * rows + 1, max_files=max_files) for x in range(pages)
+    ]
+    n_files = sum(len(reliefweb._pdf_rows(df)) for df in data)
+    with tempfile.TemporaryDirectory() as tmp:
+        t_insert = run_insert(data, synthetic.config(tmp))
+    results = [
+        {"transform": "legacy", "seconds": run(data, legacy_rows)},
+        {"transform": "_pdf_rows", "seconds": run(data, reliefweb._pdf_rows)},
+        {"transform": "_insert_pdf", "seconds": t_insert},
+    ]
+    df = pd.DataFrame(results)
+    df["pages/s"] = pages / df["seconds"]
+    click.echo(f"{pages} pages x {rows} records ({n_files} files)")
+    click.echo(df.round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmarks a reused `parallel.Executor` against per-call `parallel.run` pools.
+
+Each chunk of synthetic `_raw` rows is processed with `attribute.Prep_DF.make`, as
+in `make_attribute`. Run from the repository root:
+
+    python -m benchmark.parallel_pool --chunks 10 --rows 2000 --cores 4
+"""
+
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.corpus import attribute
+from corpusama.testing import synthetic
+from corpusama.util import io as _io
+from corpusama.util import parallel
+
+
+def per_call(chunks: list, func, cores: int) -> float:
+    """Returns seconds taken to process chunks with a new pool per chunk."""
+    t0 = perf_counter()
+    for df in chunks:
+        parallel.run(df.copy(), func, cores)
+    return perf_counter() - t0
+
+
+def reused(chunks: list, func, cores: int, start_method: str | None) -> float:
+    """Returns seconds taken to process chunks with one `Executor`."""
+    t0 = perf_counter()
+    with parallel.Executor(cores, start_method) as executor:
+        for df in chunks:
+            executor.run(df.copy(), func)
+    return perf_counter() - t0
+
+
+@click.command()
+@click.option("--chunks", default=10, show_default=True, help="Number of chunks.")
+@click.option("--rows", default=2000, show_default=True, help="Rows per chunk.")
+@click.option("--cores", default=0, show_default=True, help="Worker processes.")
+@click.option(
+    "--start-method",
+    "start_methods",
+    multiple=True,
+    default=["fork", "spawn"],
+    show_default=True,
+    help="Multiprocessing start methods to compare for `Executor`.",
+)
+def main(chunks: int, rows: int, cores: int, start_methods: list):
+    """Compares pool reuse strategies on `Prep_DF.make` workloads."""
+    attributes = _io.load_yaml("config/reliefweb_2000+.yml")["attributes"]
+    job = attribute.Prep_DF(attributes, attribute._get_params(attributes))
+    drops = ["api_params_hash", "body_html"]
+    data = [
+        synthetic.raw_df(rows, x * rows + 1).drop(columns=drops) for x in range(chunks)
+    ]
+    cores = parallel.set_cores(cores)
+    results = [{"strategy": "parallel.run", "seconds": per_call(data, job.make, cores)}]
+    for method in start_methods:
+        seconds = reused(data, job.make, cores, method)
+        results.append({"strategy": f"Executor ({method})", "seconds": seconds})
+    df = pd.DataFrame(results)
+    df["chunks/s"] = chunks / df["seconds"]
+    click.echo(f"{chunks} chunks x {rows} rows, {cores} cores")
+    click.echo(df.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmarks `pdf.Downloader` concurrency against a local HTTP server.
+
+The server adds a fixed latency to each response to mimic a remote host. Run from the
+repository root:
+
+    python -m benchmark.pdf_download --files 40 --latency 0.2 --workers 1 --workers 4
+"""
+
+import pathlib
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.source import pdf
+
+
+def serve(latency: float, size: int) -> ThreadingHTTPServer:
+    """Starts a local server returning `size` bytes after `latency` seconds."""
+    body = b"%PDF" + b"0" * (size - 4)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_workers(url: str, files: int, workers: int, rate: float) -> dict:
+    """Downloads `files` with `workers` and returns throughput."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tasks = [
+            (pathlib.Path(tmp) / f"{x}.pdf", f"{url}/{x}.pdf") for x in range(files)
+        ]
+        t0 = perf_counter()
+        with pdf.Downloader(workers, rate) as downloader:
+            statuses = [x[1]["status"] for x in downloader.run(tasks)]
+        seconds = perf_counter() - t0
+    return {
+        "workers": workers,
+        "files/s": round(files / seconds, 2),
+        "ok": statuses.count(200),
+    }
+
+
+@click.command()
+@click.option("--files", default=40, show_default=True, help="Files to download.")
+@click.option("--size", default=500000, show_default=True, help="Bytes per file.")
+@click.option("--latency", default=0.2, show_default=True, help="Server delay (s).")
+@click.option("--rate", default=50.0, show_default=True, help="Requests/s per host.")
+@click.option(
+    "--workers",
+    "workers",
+    multiple=True,
+    default=[1, 2, 4, 8],
+    show_default=True,
+    help="Concurrent downloads to compare.",
+)
+def main(files: int, size: int, latency: float, rate: float, workers: list):
+    """Compares download throughput for numbers of workers."""
+    server = serve(latency, size)
+    url = f"http://127.0.0.1:{server.server_port}"
+    results = [run_workers(url, files, w, rate) for w in workers]
+    server.shutdown()
+    click.echo(f"{files} files x {size} bytes, {latency}s latency, {rate} req/s")
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmarks page-parallel extraction of a large PDF with `pdf.ExtractFiles`.
+
+Writes a synthetic PDF with many pages of text and extracts it whole or in page
+ranges. Run from the repository root:
+
+    python -m benchmark.pdf_pages --pages 1000 --cores 4
+"""
+
+import pathlib
+import random
+import tempfile
+from time import perf_counter
+
+import click
+import fitz
+import pandas as pd
+
+from corpusama.source import pdf
+from corpusama.testing import synthetic
+
+
+def make_pdf(file: pathlib.Path, pages: int, seed: int = 0) -> None:
+    """Writes a PDF with `pages` pages of random words."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for x in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join([synthetic._words(rng, 60) for _ in range(6)])
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=9)
+    doc.save(file)
+    doc.close()
+
+
+def run_mode(file: pathlib.Path, cores: int, threshold: int, per_task: int) -> dict:
+    """Extracts `file` and returns timings."""
+    extractor = pdf.ExtractFiles(page_threshold=threshold, pages_per_task=per_task)
+    t0 = perf_counter()
+    result = extractor.run([file], timeout=600, cores=cores)[0]
+    return {
+        "mode": f"ranges of {per_task}" if threshold else "whole file",
+        "cores": cores,
+        "seconds": round(perf_counter() - t0, 2),
+        "extracted": result["extracted"],
+    }
+
+
+@click.command()
+@click.option("--pages", default=1000, show_default=True, help="Pages in the PDF.")
+@click.option("--cores", default=4, show_default=True, help="Worker processes.")
+@click.option("--per-task", default=50, show_default=True, help="Pages per range.")
+def main(pages: int, cores: int, per_task: int):
+    """Compares whole-file and page-range extraction of one large PDF."""
+    with tempfile.TemporaryDirectory() as tmp:
+        file = pathlib.Path(tmp) / "large.pdf"
+        make_pdf(file, pages)
+        results = [
+            run_mode(file, 1, 0, per_task),
+            run_mode(file, cores, 1, per_task),
+        ]
+    click.echo(f"{pages} pages")
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 """Methods to generate and modify corpus attributes."""
+import hashlib
+import json
 import logging
 from collections import OrderedDict
 
@@ -123,6 +125,10 @@ def make_attribute(
     years: bool = True,
     cores: int = 0,
     drops: list = ["api_params_hash", "body", "body_html", "redirects"],
+    incremental: bool = False,
+    executor: parallel.Executor | None = None,
+    read_depth: int = 2,
+    write_depth: int = 2,
 ) -> None:
     """Generates XML attributes for records and inserts into `_attr`.
 
@@ -133,30 +139,80 @@ def make_attribute(
         years: Run `attribute.add_years` on data (generates 4-digit year columns).
         cores: Cores to run in parallel (0 = auto-detect).
         drops: Columns in `_raw` to ignore.
+        incremental: Only process rows that are new, have a newer `date.changed` or
+            were made with different attribute settings.
+        executor: A `parallel.Executor` to reuse (otherwise one is made with `cores`).
+        read_depth: Chunks to read ahead while one is processed.
+        write_depth: Processed chunks waiting to be inserted.
 
     Notes:
         Attributes are defined in a corpus's `<config_file>.yml` `attributes` dict.
         - `drops` should exclude text content (e.g. `body_html`) and `redirects`.
         - XML tags include an empty `file_id` value: `<doc id="123" file_id=FILE_ID>`.
+        - `_attr.attr_source` stores `date.changed` and `_attr.attr_config` a hash
+            of the settings used (see `_fingerprint`). Changing `attributes`,
+            `years` or `drops` makes an incremental run regenerate every row.
+        - Reading, processing and inserting chunks overlap (see
+            `parallel.pipeline`); stage timings are logged.
+        - Rows are committed every `chunksize` rows (or `commit_every` config rows,
+            see `Database.transaction`).
     """
     raw_cols = [x[1] for x in self.db.c.execute("pragma table_info(_raw)").fetchall()]
     raw_cols = [x for x in raw_cols if x not in drops]
-    raw_query = f"""SELECT {",".join(raw_cols)} FROM _raw
-        WHERE id IN (SELECT id FROM _lang WHERE json_extract(_lang.lid,?));"""  # nosec
+    raw_query = f"""SELECT {",".join(raw_cols)},
+        json_extract(date, '$.changed') AS attr_source FROM _raw
+        WHERE id IN (SELECT id FROM _lid WHERE lang = ?)"""  # nosec
     attributes = self.config["attributes"]
     attr_params = _get_params(attributes)
+    attr_config = _fingerprint(attributes, attr_params, years, drops)
     attr_job = Prep_DF(attributes, attr_params, years=years)
     cores = parallel.set_cores(cores)
-    res = pd.read_sql(
-        raw_query, self.db.conn, chunksize=chunksize, params=(f"$.{lang}",)
-    )
-    for df in res:
-        df = parallel.run(df, attr_job.make, cores)
+    if incremental:
+        ids = self.db.c.execute(
+            """SELECT _raw.id FROM _raw LEFT JOIN _attr ON _raw.id = _attr.id
+            WHERE _raw.id IN (SELECT id FROM _lid WHERE lang = ?)
+            AND (_attr.attr_source IS NOT json_extract(_raw.date, '$.changed')
+            OR _attr.attr_config IS NOT ?)""",
+            (lang, attr_config),
+        ).fetchall()
+        ids = [x[0] for x in ids]
+        logging.info(f"{lang} - {len(ids)} new or changed")
+        res = self.db.read_ids(raw_query, ids, [lang], chunksize)
+    else:
+        res = pd.read_sql(raw_query, self.db.conn, chunksize=chunksize, params=(lang,))
+
+    def _make(df: pd.DataFrame) -> pd.DataFrame:
+        sources = dict(zip(df["id"], df.pop("attr_source")))
+        df = executor.run(df, attr_job.make)
+        df["attr_source"] = df["id"].map(sources)
+        df["attr_config"] = attr_config
+        return df
+
+    def _insert(df: pd.DataFrame) -> None:
         self.db.insert(df, "_attr")
+
+    commit_every = self.config.get("commit_every", chunksize)
+    with parallel.use_executor(executor, cores) as executor, self.db.transaction(
+        commit_every
+    ):
+        timings = parallel.pipeline(res, _make, _insert, read_depth, write_depth)
+    logging.info(f"{lang} - {timings}")
     m = f"missing attributes - {attr_job.missing}"
     logging.debug(m)
 
 
+def _fingerprint(attributes: dict, attr_params: dict, years: bool, drops: list) -> str:
+    """Returns a hash of the settings used to generate `_attr` rows."""
+    settings = {
+        "attributes": attributes,
+        "attr_params": attr_params,
+        "years": years,
+        "drops": sorted(drops),
+    }
+    settings = json.dumps(settings, sort_keys=True)
+    return hashlib.blake2b(settings.encode()).hexdigest()[:16]
+
+
 def _get_params(attributes: dict) -> dict:
     """Reads a dictionary of attributes and returns another of corpus settings.
 
@@ -0,0 +1,58 @@
+"""Reads chunks of database rows for corpus operations (e.g., `make_langid`)."""
+
+import logging
+
+import pandas as pd
+
+from corpusama.database.database import Database
+
+
+def langid_chunks(db: Database, table: str, chunksize: int, incremental: bool):
+    """Yields DataFrames of `table` rows for `make_langid` with a `lid_source` column.
+
+    Notes:
+        - In full mode, all `_pdf` rows are read (`lid_source` is null without
+            a `_manifest` row). Incremental runs read extracted files only.
+        - IDs and existing `lid_source` values are fetched before yielding, so
+            nothing is read from `_lang` while it's being written to.
+    """
+    if table == "_raw":
+        columns = [
+            "decompress(body_html) AS body_html" if x == "body_html" else x
+            for x in db.tables["_raw"]
+        ]
+        query = f"""SELECT {",".join(columns)},
+        json_extract(date, '$.changed') AS lid_source FROM _raw
+        WHERE body_html IS NOT null"""  # nosec
+        if not incremental:
+            yield from pd.read_sql(query, db.conn, chunksize=chunksize)
+            return
+        ids = db.c.execute(
+            """SELECT _raw.id FROM _raw
+            LEFT JOIN _lang ON _raw.id = _lang.id AND _lang.file_id = 0
+            WHERE _raw.body_html IS NOT null
+            AND _lang.lid_source IS NOT json_extract(_raw.date, '$.changed')"""
+        ).fetchall()
+        ids = [x[0] for x in ids]
+        logging.info(f"{table} - {len(ids)} new or changed")
+        yield from db.read_ids(query, ids, chunksize=chunksize)
+    elif table == "_pdf":
+        query = """SELECT _pdf.*, _manifest.extracted_at AS lid_source FROM _pdf
+        LEFT JOIN _manifest
+        ON _pdf.id = _manifest.id AND _pdf.file_id = _manifest.file_id"""
+        if not incremental:
+            yield from pd.read_sql(query, db.conn, chunksize=chunksize)
+            return
+        ids = db.c.execute(
+            """SELECT _manifest.file_id FROM _manifest
+            LEFT JOIN _lang
+            ON _manifest.id = _lang.id AND _manifest.file_id = _lang.file_id
+            WHERE _manifest.extracted_at IS NOT null
+            AND _lang.lid_source IS NOT _manifest.extracted_at"""
+        ).fetchall()
+        ids = [x[0] for x in ids]
+        logging.info(f"{table} - {len(ids)} new or changed")
+        query += " WHERE _manifest.extracted_at IS NOT null"
+        yield from db.read_ids(query, ids, [], chunksize, "_pdf.file_id")
+    else:
+        raise ValueError(f"table {table} not in ['_pdf', '_raw']")
@@ -1,23 +1,13 @@
 """Methods to combine sqlite and txt data before processing with a pipeline."""
 
+import hashlib
+import itertools
 import logging
 import pathlib
 
 import pandas as pd
 
-from corpusama.util import convert, parallel
-
-# TODO export_text requires unit testing
-
-
-def get_txt_file(path) -> str:
-    """Open a file at a given path and output text or `None`; warn if not found."""
-    file = pathlib.Path(path)
-    if not file.exists():
-        logging.warning(f"not found - {path}")
-        return None
-    with open(file) as f:
-        return f.read()
+from corpusama.util import convert, parallel, store, util
 
 
 def empty_warning(df: pd.DataFrame) -> None:
@@ -32,21 +22,20 @@ def empty_warning(df: pd.DataFrame) -> None:
 class _PrepareText:
     """Class to manage text preparation in parallel."""
 
-    def __init__(self, pdf_dir) -> None:
-        self.pdf_dir = pdf_dir
+    def __init__(self, texts: store.TextStore) -> None:
+        self.texts = texts
+
+    def _read(self, row: pd.Series) -> str:
+        """Returns a file's text from `self.texts` or `None`; warns if not found."""
+        text = self.texts.read(row["id"], row["file_id"])
+        if text is None:
+            logging.warning(f"not found - {row['id']}/{row['file_id']}")
+        return text
 
     def run(self, df):
         """Prepare a DataFrame of `Corpus` content so it can be exported."""
         # rename columns
         df.rename({"body_html": "text"}, inplace=True, axis=1)
-        # set TXT filepaths
-        df.loc[df["file_id"] != 0, "path"] = (
-            self.pdf_dir
-            + df["id"].astype(str)
-            + "/"
-            + df["file_id"].astype(str)
-            + ".txt"
-        )
         # update XML file_id
         df["doc_tag"] = df.apply(
             lambda x: x["doc_tag"].replace("FILE_ID", str(x["file_id"])), axis=1
@@ -55,10 +44,10 @@ class _PrepareText:
         df.loc[df["file_id"] == 0, "text"] = df.loc[df["file_id"] == 0, "text"].apply(
             convert.html_to_text
         )
-        # read TXT files
-        df.loc[df["file_id"] != 0, "text"] = df.loc[df["file_id"] != 0, "path"].apply(
-            get_txt_file
-        )
+        # read file texts
+        files = df["file_id"] != 0
+        if files.any():
+            df.loc[files, "text"] = df.loc[files].apply(self._read, axis=1)
         empty_warning(df)
         # combine text and XML tags
         df.loc[df["text"].notnull(), "text"] = (
@@ -80,6 +69,10 @@ def export_text(
     end_date: str = "2100-12-31",
     cores: int = 0,
     test: bool = False,
+    delta: bool = False,
+    executor: parallel.Executor | None = None,
+    read_depth: int = 2,
+    write_depth: int = 2,
 ):
     """Combine corpus texts for a given language and save to TXT files.
 
@@ -94,38 +87,162 @@ def export_text(
         end_date: Latest date to include.
         cores: Cores used to process items in a chunk (`0` to auto-detect).
         test: Output first file only (for testing).
+        delta: Only output texts that are new or changed since the last delta
+            export (see notes).
+        executor: A `parallel.Executor` to reuse (otherwise one is made with `cores`).
+        read_depth: Chunks to read ahead while one is processed.
+        write_depth: Processed chunks waiting to be written.
 
     Notes:
         - Combines texts with a given language, inserting XML <doc> strings with
             attributes for each text.
         - Run a test first and increase settings (`cores`, `chunksize`) to improve
             performance.
+        - With `delta`, the `_export` table records a fingerprint of each exported
+            text (`<doc>` tag included). Output files are named
+            `<stem>_<lang>_<start>_<end>_delta_<timestamp>.<chunk>.txt` and are
+            accompanied by a `.tombstones.tsv` file listing `id` and `file_id` of
+            texts to drop from earlier exports: changed texts (replaced by the
+            current delta) and texts that no longer meet `min_portion` for `lang`.
+            Texts outside the date range aren't dropped.
+        - Pass an `executor` to reuse worker processes across calls.
+        - Reading, processing and writing chunks overlap (see
+            `parallel.pipeline`); stage timings are logged.
     """
     q = """SELECT
-    _lang.id,_lang.file_id,_lang.lid,_attr.doc_tag,_raw.date,_raw.body_html FROM _lang
-    LEFT JOIN _attr ON _lang.id = _attr.id
-    LEFT JOIN _raw ON _lang.id = _raw.id
-    WHERE json_extract(_lang.lid,?) >= ?
+    _lang.id,_lang.file_id,_lang.lid,_attr.doc_tag,_raw.date,
+    decompress(_raw.body_html) AS body_html FROM _lid
+    JOIN _lang ON _lid.id = _lang.id AND _lid.file_id = _lang.file_id
+    LEFT JOIN _attr ON _lid.id = _attr.id
+    JOIN _raw ON _lid.id = _raw.id
+    WHERE _lid.lang = ? AND _lid.share >= ?
     AND DATE(json_extract(_raw.date, '$.original')) BETWEEN date(?) AND date(?)
-    ORDER BY _lang.id,_lang.file_id;"""
-    params = (f"$.{lang}", min_portion, start_date, end_date)
+    ORDER BY _lid.id,_lid.file_id;"""
+    params = (lang, min_portion, start_date, end_date)
     res = pd.read_sql(q, self.db.conn, chunksize=chunksize, params=params)
     file = pathlib.Path(f"{stem}_{lang}_{start_date}_{end_date}.txt")
+    if delta:
+        stamp = util.now()[:19].replace(":", "").replace("-", "")
+        file = file.with_name(f"{file.stem}_delta_{stamp}.txt")
+        manifest = _Manifest(self.db, lang, file.with_suffix(".tombstones.tsv"))
+    if test:
+        res = itertools.islice(res, 1)
+    texts = store.from_config(self.config)
     cores = parallel.set_cores(cores)
     batch = 1
-    for df in res:
-        if not df.empty:
-            job = _PrepareText(self.config["pdf_dir"])
-            # FIXME PATCH for pd "Columns must be same length as key" error
-            try:
-                df = parallel.run(df, job.run, cores)
-            except ValueError:
-                logging.warning("... using patch for export_text (disable parallel).")
-                df = job.run(df)
-            texts = "\n".join(df.loc[df["text"].notnull(), "text"].values)
-            with open(file.with_suffix(f".{batch}.txt"), "w") as f:
-                f.write(texts)
-            logging.debug(f'{file.with_suffix(f".{batch}.txt")}')
-            batch += 1
-            if test:
-                break
+
+    def _process(df: pd.DataFrame) -> pd.DataFrame | None:
+        if df.empty:
+            return None
+        df = _prepare(df, texts, executor)
+        if delta:
+            df = manifest.filter(df)
+            if df.empty:
+                return None
+        return df
+
+    def _write(df: pd.DataFrame) -> None:
+        nonlocal batch
+        texts = "\n".join(df.loc[df["text"].notnull(), "text"].values)
+        with open(file.with_suffix(f".{batch}.txt"), "w") as f:
+            f.write(texts)
+        logging.debug(f'{file.with_suffix(f".{batch}.txt")}')
+        if delta:
+            manifest.update(df, file.with_suffix(f".{batch}.txt").name)
+        batch += 1
+
+    with parallel.use_executor(executor, cores) as executor:
+        timings = parallel.pipeline(res, _process, _write, read_depth, write_depth)
+    logging.info(f"{lang} - {timings}")
+    if delta:
+        manifest.drop_removed(min_portion)
+
+
+def _prepare(
+    df: pd.DataFrame, texts: store.TextStore, executor: parallel.Executor
+) -> pd.DataFrame:
+    """Runs `_PrepareText` on a DataFrame (in parallel if possible)."""
+    job = _PrepareText(texts)
+    # FIXME PATCH for pd "Columns must be same length as key" error
+    try:
+        return executor.run(df, job.run)
+    except ValueError:
+        logging.warning("... using patch for export_text (disable parallel).")
+        return job.run(df)
+
+
+class _Manifest:
+    """Tracks exported texts in the `_export` table for delta exports.
+
+    Args:
+        db: A `Database` object.
+        lang: Language ISO code.
+        tombstones: TSV file listing texts to drop from earlier exports.
+
+    Notes:
+        Tombstones are appended after each chunk so an interrupted export still
+        lists texts whose new versions were written.
+    """
+
+    def filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns rows with text that's new or changed since the last export.
+
+        Notes:
+            Adds a `fingerprint` column.
+        """
+        df = df.loc[df["text"].notnull()].copy()
+        df["fingerprint"] = df["text"].apply(_fingerprint)
+        keys = zip(df["id"], df["file_id"], df["fingerprint"])
+        return df.loc[[self.exported.get((x[0], x[1])) != x[2] for x in keys]]
+
+    def update(self, df: pd.DataFrame, export_file: str) -> None:
+        """Records texts written to `export_file` and tombstones older versions."""
+        keys = list(zip(df["id"], df["file_id"]))
+        self._tombstone([k for k in keys if k in self.exported])
+        records = df[["id", "file_id", "fingerprint"]].copy()
+        records["lang"] = self.lang
+        records["export_date"] = util.now()
+        records["export_file"] = export_file
+        self.db.insert(records, "_export")
+        self.exported |= dict(zip(keys, df["fingerprint"]))
+
+    def drop_removed(self, min_portion: float) -> None:
+        """Removes and tombstones texts that no longer belong to `lang`."""
+        res = self.db.c.execute(
+            """SELECT _lid.id, _lid.file_id FROM _lid JOIN _raw ON _lid.id = _raw.id
+            WHERE _lid.lang = ? AND _lid.share >= ?""",
+            (self.lang, min_portion),
+        )
+        current = set(res.fetchall())
+        removed = [k for k in self.exported if k not in current]
+        with self.db.lock:
+            self.db.c.executemany(
+                "DELETE FROM _export WHERE lang = ? AND id = ? AND file_id = ?",
+                [(self.lang, *k) for k in removed],
+            )
+            self.db._commit(len(removed))
+        self._tombstone(removed)
+        logging.info(f"{self.tombstones} - {self.n_tombstones} tombstones")
+
+    def _tombstone(self, keys: list) -> None:
+        """Appends `(id, file_id)` keys to the tombstones file."""
+        with open(self.tombstones, "a") as f:
+            f.writelines([f"{id}\t{file_id}\n" for id, file_id in keys])
+        self.n_tombstones += len(keys)
+
+    def __init__(self, db, lang: str, tombstones: pathlib.Path) -> None:
+        self.db = db
+        self.lang = lang
+        self.tombstones = tombstones
+        self.n_tombstones = 0
+        res = self.db.c.execute(
+            "SELECT id, file_id, fingerprint FROM _export WHERE lang = ?", (lang,)
+        )
+        self.exported = {(x[0], x[1]): x[2] for x in res.fetchall()}
+        with open(self.tombstones, "w") as f:
+            f.write("id\tfile_id\n")
+
+
+def _fingerprint(text: str) -> str:
+    """Returns a hash of an exported text."""
+    return hashlib.blake2b(text.encode()).hexdigest()[:32]
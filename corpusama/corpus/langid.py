@@ -1,11 +1,14 @@
 """Methods to classify document languages and save results to the `_lang` table."""
 
+import logging
+
 # import fasttext
 import pandas as pd
 import stanza
 from stanza import DownloadMethod
 
-from corpusama.util import convert, langid, util
+from corpusama.corpus import chunks
+from corpusama.util import convert, langid, store, util
 
 # TODO requires unit testing
 
@@ -22,43 +25,60 @@ def make_langid(
     self,
     table: str,
     chunksize: int = 5000,
+    incremental: bool = False,
     # cores=0,
 ) -> None:
-    """Generates language ID data in the `_lang` table.
+    """Generates language ID data in the `_lang` and `_lid` tables.
 
     Args:
         table: Source table to get rows from (either `_pdf` or `_raw`).
         chunksize: Maximum rows to process at once.
+        incremental: Only process rows missing from `_lang` or whose source changed.
         cores: Number of processes used on each chunk (use `0` to auto-detect).
 
+    Notes:
+        - `_lid` has one row per language in `_lang.lid` (kept in sync by triggers).
+        - `_lang.lid_source` records the version of the source each result comes
+            from: `date.changed` for `_raw` rows and `_manifest.extracted_at` for
+            `_pdf` rows. A row counts as changed when this differs.
+        - With `incremental`, only `_pdf` rows with extracted text (according to
+            `_manifest`) are processed.
+        - Results are committed every `chunksize` rows (or `commit_every` config
+            rows, see `Database.transaction`): an interrupted run resumes where it
+            stopped when rerun with `incremental=True`.
+
     Warning:
-        Replaces all existing data. Must run in its entirety.
+        Without `incremental`, replaces all existing data.
     """
-    if table == "_pdf":
-        query = "SELECT * FROM _pdf"
-    if table == "_raw":
-        query = "SELECT * FROM _raw WHERE body_html IS NOT null"
-    # cores = parallel.set_cores(cores)
-    res = pd.read_sql(query, self.db.conn, chunksize=chunksize)
     pdf_dir = self.config.get("pdf_dir")
+    texts = store.from_config(self.config)
     text_column = self.config.get("text_column")
     n = 0
-    for df in res:
-        add_langid = AddLangID(table, pdf_dir, text_column)
-        n += 1
-        # df = parallel.run(df, add_langid.make, cores)
-        df = add_langid.make(df)
-        df["lang_date"] = util.now()
-        self.db.insert(df, "_lang")
+    with self.db.transaction(self.config.get("commit_every", chunksize)):
+        for df in chunks.langid_chunks(self.db, table, chunksize, incremental):
+            add_langid = AddLangID(table, pdf_dir, text_column, texts=texts)
+            n += 1
+            logging.debug(f"{table} chunk {n} - {len(df)} rows")
+            sources = df["lid_source"].values
+            # df = parallel.run(df, add_langid.make, cores)
+            df = add_langid.make(df)
+            df["lid_source"] = sources
+            df["lang_date"] = util.now()
+            self.db.insert(df, "_lang")
 
 
 class AddLangID:
-    def _make_filepath(self, df: pd.DataFrame):
-        df["local_file"] = (
-            df["id"].astype(str) + "/" + df["file_id"].astype(str) + ".txt"
-        )
-        df["local_file"] = self.pdf_dir + df["local_file"]
-        return df["local_file"].values
+    def _read_texts(self, df: pd.DataFrame):
+        """Yields the text of each `_pdf` row as it's needed (`""` if missing)."""
+        for id, file_id in zip(df["id"], df["file_id"]):
+            text = self.texts.read(id, file_id)
+            if text is None:
+                if self.texts.packed:
+                    logging.error(f"no such text - {self.texts.db_path} {id}/{file_id}")
+                else:
+                    logging.error(f"no such file - {self.texts.path(id, file_id)}")
+                text = ""
+            yield text
 
     def make(self, df: pd.DataFrame):
         # shape data for source table
@@ -66,8 +86,8 @@ class AddLangID:
             is_file = False
             s = df[self.text_column].apply(convert.html_to_text).values
         elif self.table == "_pdf":
-            is_file = True
-            s = self._make_filepath(df)
+            is_file = False
+            s = self._read_texts(df)
         # run language id
         # model = fasttext.load_model(self.model_file)
         lid = langid.LangID(
@@ -96,8 +116,10 @@ class AddLangID:
         model_file: str = "./fastText/lid.176.bin",
         sample_kwargs: dict | None = None,
         threshold: float = 0.6,
+        texts: store.TextStore | None = None,
     ) -> None:
         self.pdf_dir = pdf_dir
+        self.texts = texts if texts else store.TextStore(pdf_dir)
         self.text_column = text_column
         self.threshold = threshold
         self.table = table
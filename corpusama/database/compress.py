@@ -0,0 +1,94 @@
+"""Compresses large text values stored in the database (e.g., `_raw.body_html`).
+
+Compressed values are `BLOB`s starting with a codec byte:
+
+- `x`: raw LZMA2 (xz without container overhead)
+- `z`: zlib, followed by a 4-byte id of a preset dictionary in `_zdict` (`0` for
+    none), see `train_dictionary`
+
+Text values are left as they are, so a column can mix compressed and plain values.
+"""
+
+import collections
+import lzma
+import re
+import zlib
+
+codecs = ["lzma", "zlib"]
+lzma_filters = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+# tags and words counted when training dictionaries
+_tokens = re.compile(r"<[^>]{1,80}>|[^<\s]{3,24}\s?")
+
+
+def compress(text: str, codec: str, zdict: bytes | None = None, zdict_id: int = 0):
+    """Returns a compressed text.
+
+    Args:
+        text: The text.
+        codec: `lzma` or `zlib`.
+        zdict: A zlib preset dictionary (see `train_dictionary`).
+        zdict_id: The dictionary's `_zdict.id`.
+    """
+    data = text.encode()
+    if codec == "lzma":
+        return b"x" + lzma.compress(data, lzma.FORMAT_RAW, filters=lzma_filters)
+    if codec == "zlib":
+        if zdict:
+            compressor = zlib.compressobj(9, zdict=zdict)
+        else:
+            compressor = zlib.compressobj(9)
+            zdict_id = 0
+        data = compressor.compress(data) + compressor.flush()
+        return b"z" + zdict_id.to_bytes(4, "big") + data
+    raise ValueError(f"codec {codec} not in {codecs}")
+
+
+def decompress(value, zdicts: dict = {}):
+    """Returns a decompressed text (other values are returned as-is).
+
+    Args:
+        value: A value from the database.
+        zdicts: Preset dictionaries by `_zdict.id`.
+    """
+    if not isinstance(value, bytes) or not value:
+        return value
+    if value[:1] == b"x":
+        data = lzma.decompress(value[1:], lzma.FORMAT_RAW, filters=lzma_filters)
+        return data.decode()
+    if value[:1] == b"z":
+        zdict_id = int.from_bytes(value[1:5], "big")
+        if zdict_id:
+            decompressor = zlib.decompressobj(zdict=zdicts[zdict_id])
+        else:
+            decompressor = zlib.decompressobj()
+        return (decompressor.decompress(value[5:]) + decompressor.flush()).decode()
+    return value
+
+
+def train_dictionary(samples: list, size: int = 32768) -> bytes:
+    """Returns a zlib preset dictionary made of frequent tags and words in samples.
+
+    Args:
+        samples: Texts like those to compress.
+        size: Maximum dictionary size in bytes (zlib uses up to 32 KiB).
+
+    Notes:
+        Tokens are ranked by the bytes they would save (`count * length`). The most
+        useful ones are placed at the end, where zlib matches them at shorter
+        distances.
+    """
+    counts = collections.Counter()
+    for text in samples:
+        counts.update(_tokens.findall(text))
+    ranked = sorted(counts, key=lambda x: counts[x] * len(x), reverse=True)
+    chosen = []
+    n = 0
+    for token in ranked:
+        if counts[token] < 2:
+            break
+        length = len(token.encode())
+        if n + length > size:
+            continue
+        chosen.append(token)
+        n += length
+    return "".join(reversed(chosen)).encode()
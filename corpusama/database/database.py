@@ -2,26 +2,106 @@
 import logging
 import pathlib
 import re
+import shutil
 import sqlite3 as sql
+import threading
+from contextlib import contextmanager
 
 import pandas as pd
 
+from corpusama.database import compress, snapshot
 from corpusama.util import convert
 from corpusama.util import io as _io
 
+# PRAGMA settings applied in this order when opening a connection
+pragmas = [
+    "page_size",
+    "journal_mode",
+    "synchronous",
+    "temp_store",
+    "cache_size",
+    "mmap_size",
+]
+
+# connection profiles selectable with the `db_profile` config key
+profiles = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+    },
+    "bulk": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "temp_store": "MEMORY",
+        "cache_size": -256000,
+        "mmap_size": 1073741824,
+    },
+}
+
+
+def get_profile(profile: str | dict | None) -> dict:
+    """Returns a dict of PRAGMA settings for a connection profile.
+
+    Args:
+        profile: A key in `database.profiles` or a dict of PRAGMA settings. A dict
+            may include a `profile` key to override the settings of a named profile.
+
+    Notes:
+        - Only PRAGMAs in `database.pragmas` are accepted.
+        - `page_size` only affects new databases (or existing ones after `VACUUM`
+            when not in WAL mode).
+    """
+    if not profile:
+        profile = "default"
+    if isinstance(profile, str):
+        profile = {"profile": profile}
+    profile = profile.copy()
+    name = profile.pop("profile", "default")
+    if name not in profiles:
+        raise ValueError(f"profile {name} not in {list(profiles)}")
+    settings = profiles[name] | profile
+    for k, v in settings.items():
+        if k not in pragmas:
+            raise ValueError(f"PRAGMA {k} not in {pragmas}")
+        if not re.match(r"^-?\w+$", str(v)):
+            raise ValueError(f"invalid value for PRAGMA {k}: {v}")
+    return {k: settings[k] for k in pragmas if k in settings}
+
 
 class Database:
     """A class for managing an SQL database with corpusama content.
 
     Args:
         config: YAML configuration file.
+
+    Notes:
+        - The `db_profile` config key sets PRAGMAs for each connection (see
+            `database.get_profile`). Defaults to SQLite's own settings.
+        - The `compress` config key sets columns to compress, e.g.
+            `{_raw.body_html: zlib}` (see `database.compress`). Read them with
+            `decompress(<column>)` in queries.
     """
 
     def open_db(self) -> None:
-        """Opens an SQL database connection."""
-        self.conn = sql.connect(self.path)
+        """Opens an SQL database connection and applies its PRAGMA settings.
+
+        Notes:
+            - Queries can use `decompress(<column>)` (see `Database.decompress`).
+            - The connection may be used by other threads (e.g., `parallel.pipeline`
+                stages), but only one at a time should write: `insert`,
+                `update_column` and writes from other threads hold `self.lock`.
+        """
+        self.conn = sql.connect(self.path, check_same_thread=False)
+        self.conn.create_function("decompress", 1, self.decompress, deterministic=True)
         self.c = self.conn.cursor()
-        logging.debug(f"{self.path}")
+        for k, v in self.pragmas.items():
+            self.c.execute(f"PRAGMA {k} = {v}")  # nosec
+        logging.debug(f"{self.path} {self.pragmas}")
 
     def close_db(self) -> None:
         """Closes an SQL database connection."""
@@ -30,36 +110,114 @@ class Database:
         self.conn.close()
         logging.debug(f"{self.path}")
 
+    def migrate(self) -> None:
+        """Applies `config.schema` and brings existing databases up to date.
+
+        Notes:
+            - Adds missing tables, indexes and triggers (all use `IF NOT EXISTS`).
+            - Adds columns missing from existing tables (must be nullable).
+            - Fills `_lid` from `_lang` when `_lid` is empty.
+        """
+        self.c.executescript(_io.load_yaml(self.config.get("schema")))
+        for table, columns in self.columns.items():
+            res = self.c.execute(f"pragma table_info({table})").fetchall()
+            existing = [x[1] for x in res]
+            for name, definition in columns.items():
+                if name not in existing:
+                    self.c.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+                    logging.info(f"added {table}.{name}")
+        if not self.c.execute("SELECT 1 FROM _lid LIMIT 1").fetchone():
+            self.c.execute(
+                """INSERT INTO _lid SELECT _lang.id, _lang.file_id, key, value
+                FROM _lang, json_each(_lang.lid) WHERE json_valid(_lang.lid)"""
+            )
+        self.conn.commit()
+        logging.debug(f"{self.path}")
+
     def get_tables(self) -> None:
-        """Makes a dict of database tables from `config.schema`."""
+        """Makes dicts of database tables and column definitions from `config.schema`.
+
+        Notes:
+            `self.tables` has lists of column names and `self.columns` has dicts of
+            `{name: definition}` (e.g., `{"id": "'id' INTEGER NOT NULL"}`).
+        """
 
         def _name(table: str):
-            return re.findall(r"CREATE TABLE.*(_\w+).*", table)[0]
+            return re.findall(r"CREATE TABLE (?:IF NOT EXISTS )?(_\w+)", table)[0]
 
         def _columns(table: str):
-            return [x.strip("\n '") for x in re.findall(r"\n'\w+'", table) if x]
+            return {x[1]: x[0] for x in re.findall(r"\n('(\w+)'[^,\n]*)", table)}
 
         with open(self.config.get("schema")) as f:
             schema = f.read()
-        tables = [x for x in schema.split(";") if x.strip()]
-        self.tables = {_name(t): _columns(t) for t in tables}
-
-    def insert(self, df: pd.DataFrame, table: str) -> None:
-        """Inserts/replaces a DataFrame into a table."""
-        # standardize datatypes
-        df = df.map(convert.to_json_or_str)
-        df = df.apply(convert.nan_to_none)
+        tables = [x for x in schema.split(";") if "CREATE TABLE" in x]
+        self.columns = {_name(t): _columns(t) for t in tables}
+        self.tables = {k: list(v) for k, v in self.columns.items()}
+
+    def insert(self, df: pd.DataFrame, table: str, typed: bool = True) -> None:
+        """Inserts/replaces a DataFrame into a table.
+
+        Args:
+            df: The data, with a column for each of the table's columns.
+            table: The destination table.
+            typed: Convert values column by column (see `convert.to_sql_values`).
+                Otherwise, every value is converted to a string and then `None`
+                if NaN-like (`convert.to_json_or_str` and `convert.nan_to_none`).
+
+        Notes:
+            - Rows are inserted in one transaction (rolled back on errors) and
+                committed unless within `transaction`.
+            - Columns set in the `compress` config key are compressed.
+        """
+        columns = self.tables[table]
+        if typed:
+            values = [convert.to_sql_values(df[x]) for x in columns]
+        else:
+            # standardize datatypes
+            df = df[columns].map(convert.to_json_or_str)
+            df = df.apply(convert.nan_to_none)
+            values = [df[x].tolist() for x in columns]
+        values = [self._compress(table, x, y) for x, y in zip(columns, values)]
+        records = zip(*values)
         # insert into SQL
-        records = df[self.tables[table]].to_records(index=False)
-        n_columns = len(self.tables[table])
-        values = ",".join(list("?" * n_columns))
-        self.c.executemany(
-            f"INSERT OR REPLACE INTO {table} VALUES ({values})",
-            records,
-        )
-        self.conn.commit()
+        names = ",".join(columns)
+        values = ",".join(list("?" * len(columns)))
+        with self.lock:
+            try:
+                self.c.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({names}) VALUES ({values})",
+                    records,
+                )
+            except Exception:
+                if self._batch is None:
+                    self.conn.rollback()
+                raise
+            self._commit(len(df))
         logging.debug(f"{len(df)} row(s) into {table}")
 
+    def read_ids(
+        self,
+        query: str,
+        ids: list,
+        params: list = [],
+        chunksize: int = 10000,
+        column: str = "id",
+    ):
+        """Yields DataFrames of query results for chunks of `ids`.
+
+        Args:
+            query: A query ending with a `WHERE` clause (`AND <column> IN (...)` is
+                added).
+            ids: Values for `column`.
+            params: Parameters for placeholders in `query`.
+            chunksize: Maximum number of ids per DataFrame.
+            column: Column to match `ids` against (e.g., `_pdf.file_id`).
+        """
+        for x in range(0, len(ids), chunksize):
+            chunk = list(ids[x : x + chunksize])
+            q = f"{query} AND {column} IN ({','.join('?' * len(chunk))})"  # nosec
+            yield pd.read_sql(q, self.conn, params=list(params) + chunk)
+
     def update_column(
         self, table: str, column: str, series: pd.Series, rowids: list
     ) -> None:
@@ -71,17 +229,289 @@ class Database:
             series: The new data .
             rowids: The column's rowids.
         """
-        if table not in self.tables.keys():
-            raise ValueError(f"table {table} not in {self.tables.key()}")
-        if column not in self.tables.get(table):
-            raise ValueError(f"column {column} not in {self.tables.get(table)}")
+        self._check_column(table, column)
         series = series.apply(convert.to_json_or_str)
         series = convert.nan_to_none(series)
+        values = self._compress(table, column, series.tolist())
         q = f"UPDATE {table} SET {column} = ? WHERE rowid = ?"  # nosec
-        self.c.executemany(q, zip(series, rowids))
-        self.conn.commit()
+        with self.lock:
+            self.c.executemany(q, zip(values, rowids))
+            self._commit(len(series))
         logging.debug(f"{len(series)} values into {table}.{column}")
 
+    def decompress(self, value):
+        """Returns a value decompressed if compressed (see `database.compress`)."""
+        return compress.decompress(value, self.zdicts)
+
+    def _compress(self, table: str, column: str, values: list) -> list:
+        """Returns values compressed if set in the `compress` config key."""
+        codec = self.compression.get(f"{table}.{column}")
+        if not codec or codec == "none":
+            return values
+        zdict_id = self.zdict_ids.get(f"{table}.{column}", 0)
+        zdict = self.zdicts.get(zdict_id)
+        return [
+            compress.compress(x, codec, zdict, zdict_id) if isinstance(x, str) else x
+            for x in values
+        ]
+
+    def _check_column(self, table: str, column: str) -> None:
+        """Raises `ValueError` if a table or column isn't in `config.schema`."""
+        if table not in self.tables.keys():
+            raise ValueError(f"table {table} not in {self.tables.keys()}")
+        if column not in self.tables.get(table):
+            raise ValueError(f"column {column} not in {self.tables.get(table)}")
+
+    def train_dictionary(
+        self,
+        table: str = "_raw",
+        column: str = "body_html",
+        samples: int = 1000,
+        size: int = 32768,
+    ) -> int:
+        """Trains a zlib dictionary on a column's values and uses it from now on.
+
+        Args:
+            table: The table.
+            column: The column.
+            samples: Number of random values to train on.
+            size: Maximum dictionary size in bytes.
+
+        Returns:
+            The dictionary's `_zdict.id`.
+
+        Notes:
+            Only values compressed afterwards use the dictionary (see `recompress`).
+        """
+        self._check_column(table, column)
+        res = self.c.execute(
+            f"""SELECT decompress({column}) FROM {table} WHERE {column} IS NOT NULL
+            ORDER BY random() LIMIT ?""",  # nosec
+            (samples,),
+        ).fetchall()
+        zdict = compress.train_dictionary([x[0] for x in res], size)
+        created_at = pd.Timestamp.now(tz="UTC").round("s").isoformat()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO _zdict (table_column, zdict, created_at) VALUES (?, ?, ?)",
+                (f"{table}.{column}", zdict, created_at),
+            )
+            self._commit(0)
+        self.zdicts[cursor.lastrowid] = zdict
+        self.zdict_ids[f"{table}.{column}"] = cursor.lastrowid
+        logging.info(f"{table}.{column} - {len(res)} samples, {len(zdict)} bytes")
+        return cursor.lastrowid
+
+    def recompress(
+        self, table: str = "_raw", column: str = "body_html", chunksize: int = 1000
+    ) -> int:
+        """Rewrites a column's values with its current `compress` setting.
+
+        Args:
+            table: The table.
+            column: The column.
+            chunksize: Rows rewritten at a time.
+
+        Returns:
+            Number of rows rewritten.
+
+        Notes:
+            - Compresses existing values (or decompresses them if the column isn't
+                set or is `none`).
+            - Run `VACUUM` afterwards to reduce the database file size.
+        """
+        self._check_column(table, column)
+        rowids = self.c.execute(
+            f"SELECT rowid FROM {table} WHERE {column} IS NOT NULL"  # nosec
+        ).fetchall()
+        rowids = [x[0] for x in rowids]
+        with self.transaction():
+            for x in range(0, len(rowids), chunksize):
+                chunk = rowids[x : x + chunksize]
+                res = self.c.execute(
+                    f"""SELECT rowid, decompress({column}) FROM {table}
+                    WHERE rowid IN ({",".join("?" * len(chunk))})""",  # nosec
+                    chunk,
+                ).fetchall()
+                values = self._compress(table, column, [x[1] for x in res])
+                with self.lock:
+                    self.c.executemany(
+                        f"UPDATE {table} SET {column} = ? WHERE rowid = ?",  # nosec
+                        zip(values, [x[0] for x in res]),
+                    )
+                    self._commit(len(res))
+        logging.info(f"{table}.{column} - {len(rowids)} rows")
+        return len(rowids)
+
+    def snapshot(
+        self,
+        path: str,
+        tables: list = snapshot.tables,
+        chunksize: int = 10000,
+        full: bool = False,
+    ) -> dict:
+        """Writes Parquet snapshots of tables, partitioned by year.
+
+        Args:
+            path: Snapshot directory (see `database.snapshot`).
+            tables: Tables with an `id` column from `_raw`.
+            chunksize: Rows per Parquet file.
+            full: Rewrite all partitions.
+
+        Returns:
+            Partitions written per table.
+
+        Notes:
+            - JSON columns are flattened into attribute columns (see
+                `snapshot.flatten_json`) and compressed columns are decompressed.
+            - Refreshes are incremental: a partition is rewritten only if its row
+                count, latest `_raw.date.changed` or the table's own changes (e.g.,
+                `_lang.lang_date`, `_attr.attr_config`, see `snapshot.changed_sql`)
+                differ from the last snapshot (`_snapshot`), and removed when
+                empty. Use `full=True` after other changes, e.g., to `_raw` rows
+                without a new `date.changed`.
+            - Read snapshots with `snapshot.read`. Requires `pyarrow`.
+        """
+        written = {}
+        for table in tables:
+            self._check_column(table, "id")
+            changed = "MAX(json_extract(_raw.date, '$.changed'))"
+            if table in snapshot.changed_sql:
+                changed += f" || '|' || COALESCE({snapshot.changed_sql[table]}, '')"
+            join = "" if table == "_raw" else f"JOIN _raw ON {table}.id = _raw.id"
+            res = self.c.execute(
+                f"""SELECT COALESCE({snapshot.year_sql}, 0) AS year, COUNT(*),
+                {changed} FROM {table} {join} GROUP BY year"""  # nosec
+            ).fetchall()
+            current = {x[0]: x[1:] for x in res}
+            res = self.c.execute(
+                "SELECT year, rows, changed FROM _snapshot WHERE table_name = ?",
+                (table,),
+            ).fetchall()
+            previous = {x[0]: x[1:] for x in res}
+            columns = [
+                (
+                    f"decompress({table}.{x}) AS {x}"
+                    if f"{table}.{x}" in self.compression
+                    or f"{table}.{x}" in self.zdict_ids
+                    else f"{table}.{x}"
+                )
+                for x in self.tables[table]
+            ]
+            written[table] = 0
+            for year, signature in sorted(current.items()):
+                partition = pathlib.Path(path, table, f"year={year}")
+                if not full and previous.get(year) == signature and partition.exists():
+                    continue
+                if year:
+                    where = (
+                        "DATE(json_extract(_raw.date, '$.original')) BETWEEN ? AND ?"
+                    )
+                    params = (f"{year}-01-01", f"{year}-12-31")
+                else:
+                    where = "DATE(json_extract(_raw.date, '$.original')) IS NULL"
+                    params = ()
+                q = f"SELECT {', '.join(columns)} FROM {table} {join} WHERE {where}"
+                part = partition.with_name(f"{partition.name}.part")
+                shutil.rmtree(part, ignore_errors=True)
+                part.mkdir(parents=True)
+                chunks = pd.read_sql(q, self.conn, params=params, chunksize=chunksize)
+                for n, df in enumerate(chunks):
+                    df = snapshot.flatten_json(df)
+                    df.to_parquet(part / f"part-{n}.parquet", index=False)
+                shutil.rmtree(partition, ignore_errors=True)
+                part.rename(partition)
+                self._update_snapshot(table, year, signature)
+                written[table] += 1
+            for year in [x for x in previous if x not in current]:
+                shutil.rmtree(pathlib.Path(path, table, f"year={year}"), True)
+                with self.lock:
+                    self.c.execute(
+                        "DELETE FROM _snapshot WHERE table_name = ? AND year = ?",
+                        (table, year),
+                    )
+                    self._commit(0)
+            logging.info(f"{table} - {written[table]} of {len(current)} partition(s)")
+        return written
+
+    def _update_snapshot(self, table: str, year: int, signature: tuple) -> None:
+        """Records a partition written by `snapshot`."""
+        snapshot_date = pd.Timestamp.now(tz="UTC").round("s").isoformat()
+        with self.lock:
+            self.c.execute(
+                """INSERT INTO _snapshot
+                (table_name, year, rows, changed, snapshot_date)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (table_name, year) DO UPDATE SET
+                rows = excluded.rows, changed = excluded.changed,
+                snapshot_date = excluded.snapshot_date""",
+                (table, year, *signature, snapshot_date),
+            )
+            self._commit(0)
+
+    @contextmanager
+    def transaction(self, commit_every: int | None = None):
+        """Groups writes by `insert` and `update_column` into fewer commits.
+
+        Args:
+            commit_every: Commit once this many rows have been written since the
+                last commit (`0` to commit only on exit). Defaults to the
+                `commit_every` config key or `0`.
+
+        Notes:
+            - Commits on exit. An exception rolls back rows not yet committed
+                (except for `execute_durable` writes).
+            - A nested `transaction` joins the outer one (and its `commit_every`).
+            - Other threads' `insert` calls join the transaction too.
+        """
+        if self._batch is not None:
+            yield self
+            return None
+        if commit_every is None:
+            commit_every = self.config.get("commit_every", 0)
+        self._batch = {"rows": 0, "every": commit_every, "durable": []}
+        try:
+            yield self
+        except BaseException:
+            with self.lock:
+                self.conn.rollback()
+                for query, params in self._batch["durable"]:
+                    self.conn.execute(query, params)
+                self.conn.commit()
+                self._batch = None
+            raise
+        else:
+            with self.lock:
+                self.conn.commit()
+        finally:
+            self._batch = None
+
+    def _commit(self, rows: int) -> None:
+        """Commits `rows` written, when a `transaction` is due (hold `self.lock`)."""
+        if self._batch is None:
+            self.conn.commit()
+            return None
+        self._batch["rows"] += rows
+        if self._batch["every"] and self._batch["rows"] >= self._batch["every"]:
+            self.conn.commit()
+            logging.debug(f"{self._batch['rows']} row(s)")
+            self._batch["rows"] = 0
+            self._batch["durable"].clear()
+
+    def execute_durable(self, query: str, params: tuple = ()) -> None:
+        """Executes a write that is kept even if a `transaction` rolls back.
+
+        Notes:
+            - Requires `self.lock`. Commits at once outside a `transaction`.
+            - Inside one, the write is committed with it, or repeated and committed
+                after a rollback (e.g., counting API calls, see `Call._count_call`).
+        """
+        self.conn.execute(query, params)
+        if self._batch is None:
+            self.conn.commit()
+        else:
+            self._batch["durable"].append((query, params))
+
     def _add_missing_columns(self, df: pd.DataFrame, table: str) -> pd.DataFrame:
         """Returns a DataFrame with database table columns added when missing.
 
@@ -100,7 +530,20 @@ class Database:
         secrets = pathlib.Path(config).with_suffix(".secret.yml")
         self.config = _io.load_yaml(config) | _io.load_yaml(secrets)
         self.path = pathlib.Path(self.config.get("db_name"))
+        self.pragmas = get_profile(self.config.get("db_profile"))
+        self.lock = threading.Lock()
+        self._batch = None
+        self.compression = self.config.get("compress", {})
+        for codec in self.compression.values():
+            if codec not in compress.codecs + ["none", None]:
+                raise ValueError(f"codec {codec} not in {compress.codecs}")
+        self.zdicts = {}
+        self.zdict_ids = {}
         self.path.parent.mkdir(exist_ok=True)
         self.open_db()
-        self.c.executescript(_io.load_yaml(self.config.get("schema")))
         self.get_tables()
+        self.migrate()
+        res = self.c.execute("SELECT id, table_column, zdict FROM _zdict ORDER BY id")
+        for id, table_column, zdict in res.fetchall():
+            self.zdicts[id] = zdict
+            self.zdict_ids[table_column] = id
@@ -8,6 +8,35 @@ CREATE TABLE IF NOT EXISTS _log (
 FOREIGN KEY('api_params_hash') REFERENCES _raw ('api_params_hash')
 );
 
+CREATE TABLE IF NOT EXISTS _quota (
+'source' TEXT NOT NULL,
+'day' TEXT NOT NULL,
+'calls' INTEGER NOT NULL,
+PRIMARY KEY ('source', 'day')
+);
+
+CREATE TABLE IF NOT EXISTS _harvest (
+'params_hash' TEXT PRIMARY KEY,
+'params' TEXT NOT NULL,
+'date_changed' TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS _zdict (
+'id' INTEGER PRIMARY KEY,
+'table_column' TEXT NOT NULL,
+'zdict' BLOB NOT NULL,
+'created_at' TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS _snapshot (
+'table_name' TEXT NOT NULL,
+'year' INTEGER NOT NULL,
+'rows' INTEGER NOT NULL,
+'changed' TEXT,
+'snapshot_date' TEXT NOT NULL,
+PRIMARY KEY ('table_name', 'year')
+);
+
 CREATE TABLE IF NOT EXISTS _pdf (
 'id' INTEGER NOT NULL,
 'file_id' INTEGER NOT NULL UNIQUE,
@@ -19,22 +48,62 @@ CREATE TABLE IF NOT EXISTS _pdf (
 FOREIGN KEY('id') REFERENCES _raw ('id')
 );
 
+CREATE TABLE IF NOT EXISTS _manifest (
+'id' INTEGER NOT NULL,
+'file_id' INTEGER NOT NULL,
+'url' TEXT,
+'size' INTEGER,
+'sha256' TEXT,
+'downloaded_at' TEXT,
+'extracted_at' TEXT,
+'extractor_version' TEXT,
+'etag' TEXT,
+'last_modified' TEXT,
+'failed_at' TEXT,
+'error' TEXT,
+FOREIGN KEY('id') REFERENCES _raw ('id')
+PRIMARY KEY ('id', 'file_id')
+);
+
 CREATE TABLE IF NOT EXISTS _lang (
 'id' INTEGER NOT NULL,
 'file_id' INTEGER NOT NULL,
 'lang_date' TEXT NOT NULL,
 'lid' TEXT,
+'lid_source' TEXT,
 FOREIGN KEY('id') REFERENCES _raw ('id')
 PRIMARY KEY ('id', 'file_id')
 );
 
+CREATE TABLE IF NOT EXISTS _lid (
+'id' INTEGER NOT NULL,
+'file_id' INTEGER NOT NULL,
+'lang' TEXT NOT NULL,
+'share' REAL,
+FOREIGN KEY('id', 'file_id') REFERENCES _lang ('id', 'file_id')
+PRIMARY KEY ('id', 'file_id', 'lang')
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS _attr (
 'id' INTEGER NOT NULL,
 'doc_tag' TEXT NOT NULL,
+'attr_source' TEXT,
+'attr_config' TEXT,
 FOREIGN KEY('id') REFERENCES _raw ('id')
 PRIMARY KEY ('id')
 );
 
+CREATE TABLE IF NOT EXISTS _export (
+'lang' TEXT NOT NULL,
+'id' INTEGER NOT NULL,
+'file_id' INTEGER NOT NULL,
+'fingerprint' TEXT NOT NULL,
+'export_date' TEXT NOT NULL,
+'export_file' TEXT,
+FOREIGN KEY('id') REFERENCES _raw ('id')
+PRIMARY KEY ('lang', 'id', 'file_id')
+);
+
 CREATE TABLE IF NOT EXISTS _raw  (
 'api_params_hash' TEXT NOT NULL,
 'id' INTEGER PRIMARY KEY,
@@ -62,3 +131,39 @@ CREATE TABLE IF NOT EXISTS _raw  (
 'body' TEXT,
 'body_html' TEXT
 );
+
+CREATE INDEX IF NOT EXISTS _raw_date_changed
+ON _raw (json_extract(date, '$.changed'));
+
+CREATE INDEX IF NOT EXISTS _raw_date_original
+ON _raw (DATE(json_extract(date, '$.original')));
+
+CREATE INDEX IF NOT EXISTS _lid_lang_share
+ON _lid (lang, share);
+
+CREATE TRIGGER IF NOT EXISTS _lang_insert_lid_before
+BEFORE INSERT ON _lang
+BEGIN
+DELETE FROM _lid WHERE id = NEW.id AND file_id = NEW.file_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS _lang_insert_lid
+AFTER INSERT ON _lang
+BEGIN
+INSERT INTO _lid SELECT NEW.id, NEW.file_id, key, value
+FROM json_each(NEW.lid) WHERE json_valid(NEW.lid);
+END;
+
+CREATE TRIGGER IF NOT EXISTS _lang_update_lid
+AFTER UPDATE OF lid ON _lang
+BEGIN
+DELETE FROM _lid WHERE id = OLD.id AND file_id = OLD.file_id;
+INSERT INTO _lid SELECT NEW.id, NEW.file_id, key, value
+FROM json_each(NEW.lid) WHERE json_valid(NEW.lid);
+END;
+
+CREATE TRIGGER IF NOT EXISTS _lang_delete_lid
+AFTER DELETE ON _lang
+BEGIN
+DELETE FROM _lid WHERE id = OLD.id AND file_id = OLD.file_id;
+END;
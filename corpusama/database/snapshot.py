@@ -0,0 +1,96 @@
+"""Reads and prepares Parquet snapshots of database tables (see `Database.snapshot`).
+
+Snapshots are partitioned by table and year (`<path>/<table>/year=<year>/`), where
+the year is `_raw.date.original` (`0` if missing). Each partition has one or more
+`part-<n>.parquet` files.
+
+Notes:
+    Requires `pyarrow` (not a dependency of `corpusama`: `pip install pyarrow`).
+"""
+
+import json
+import pathlib
+
+import pandas as pd
+
+from corpusama.util import flatten
+
+# tables snapshotted by default
+tables = ["_raw", "_pdf", "_lang", "_attr"]
+# a partition's year, matching the `_raw_date_original` index
+year_sql = "CAST(strftime('%Y', DATE(json_extract(_raw.date, '$.original'))) AS INT)"
+# per-table changes added to a partition's signature (see `Database.snapshot`)
+_attr_sql = "_attr.attr_config || '|' || _attr.attr_source"
+changed_sql = {
+    "_pdf": "MAX(_pdf.file_id) || '|' || TOTAL(_pdf.filesize)",
+    "_lang": "MAX(_lang.lang_date)",
+    "_attr": f"MIN({_attr_sql}) || '|' || MAX({_attr_sql})",
+}
+
+
+def _parse(item):
+    """Returns a JSON list/dict string as an object, otherwise `item` as-is."""
+    if isinstance(item, str) and item[:1] in ["[", "{"]:
+        try:
+            return json.loads(item)
+        except json.JSONDecodeError:
+            return item
+    return item
+
+
+def flatten_json(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns a DataFrame with JSON columns flattened into attribute columns.
+
+    Notes:
+        - Column names are made as in `Attribute.make`, e.g., `date__original`,
+            `country__name`, `lid__en`. Lists are kept as lists.
+        - Other text columns (e.g., `body_html`) aren't parsed.
+    """
+    df = df.reset_index(drop=True)
+    for col in df.select_dtypes("object").columns:
+        parsed = df[col].map(_parse)
+        if not parsed.map(lambda x: isinstance(x, (list, dict))).any():
+            continue
+        flat = flatten.dataframe(parsed.to_frame(col), reset_index=False)
+        flat.columns = [x.replace(".", "__").replace("-", "_") for x in flat.columns]
+        df = pd.concat([df.drop(columns=col), flat], axis=1)
+    return df
+
+
+def read(
+    path: str,
+    table: str,
+    years: list | None = None,
+    columns: list | None = None,
+) -> pd.DataFrame:
+    """Returns a table's snapshot as a DataFrame.
+
+    Args:
+        path: Snapshot directory.
+        table: The table.
+        years: Years to read (default: all).
+        columns: Columns to read (default: all). Includes `year`.
+
+    Notes:
+        Partitions may have different columns (attributes are flattened per file):
+        their schemas are unified and missing values are null.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    files = sorted(pathlib.Path(path, table).glob("year=*/*.parquet"))
+    if years is not None:
+        files = [x for x in files if int(x.parent.name[5:]) in years]
+    if not files:
+        return pd.DataFrame(columns=columns)
+    schema = pa.unify_schemas(
+        [ds.dataset(x).schema for x in files], promote_options="permissive"
+    )
+    schema = schema.append(pa.field("year", pa.int64()))
+    dataset = ds.dataset(
+        [str(x) for x in files],
+        schema=schema,
+        partitioning="hive",
+        partition_base_dir=str(pathlib.Path(path, table)),
+    )
+    return dataset.to_table(columns=columns).to_pandas()
@@ -1,10 +1,13 @@
 """A module for managing the Call class, a base class for API call management."""
 
+import datetime
 import hashlib
 import json
 import logging
+import lzma
 import pathlib
 import time
+from time import perf_counter
 
 import requests
 
@@ -13,6 +16,67 @@ from corpusama.util import io as _io
 from corpusama.util import util
 
 
+def params_hash(params: dict, exclude: list = []) -> str:
+    """Returns a hash of a sorted dictionary of parameters (except `exclude` keys)."""
+    params = {k: v for k, v in params.items() if k not in exclude}
+    params = json.dumps(params, sort_keys=True)
+    return hashlib.blake2b(params.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Records API responses to compressed files and replays them.
+
+    Args:
+        dir: Where responses are saved, as `<hash>/<offset>.json.xz` (`hash` is made
+            from parameters other than `offset`).
+        mode: `record` (make calls and save responses) or `replay` (return saved
+            responses without making calls).
+        timing: Replay delay as a multiple of each response's recorded time (`0` for
+            no delay).
+
+    Notes:
+        Set with the `api_cache` config key, e.g.:
+
+        ```yaml
+        api_cache: {dir: data/api_cache/, mode: replay, timing: 1}
+        ```
+    """
+
+    def path(self, params: dict) -> pathlib.Path:
+        """Returns the filepath of the response to a call."""
+        key = params_hash(params, ["offset"])
+        return self.dir / key / f"{params.get('offset', 0)}.json.xz"
+
+    def save(self, params: dict, response_json: dict, seconds: float) -> None:
+        """Saves a response and the seconds it took."""
+        file = self.path(params)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        record = {"seconds": seconds, "parameters": params, "response": response_json}
+        part = file.with_name(f".{file.name}.part")
+        with lzma.open(part, "wt") as f:
+            json.dump(record, f)
+        part.replace(file)
+        logging.debug(f"{file}")
+
+    def replay(self, params: dict) -> dict:
+        """Returns a saved response after its recorded time (scaled by `timing`)."""
+        file = self.path(params)
+        if not file.exists():
+            raise FileNotFoundError(f"no recorded response {file} for {params}")
+        with lzma.open(file, "rt") as f:
+            record = json.load(f)
+        time.sleep(record["seconds"] * self.timing)
+        logging.debug(f"{file}")
+        return record["response"]
+
+    def __init__(self, dir: str, mode: str = "replay", timing: float = 1):
+        if mode not in ["record", "replay"]:
+            raise ValueError(f"mode {mode} not in ['record', 'replay']")
+        self.dir = pathlib.Path(dir)
+        self.mode = mode
+        self.timing = timing
+
+
 class Call:
     """A base class with common methods for managing API calls."""
 
@@ -25,19 +89,89 @@ class Call:
         self.response_json = response_json
         logging.debug(f"{self.response.status_code}")
 
-    def _calls_made(self) -> None:
-        """Calculates the number of calls already made in the log file."""
+    def quota_status(self) -> dict:
+        """Returns today's API usage for `config.source` from the `_quota` table.
+
+        Returns:
+            `calls_made` and `calls_remaining` for the current UTC day and `reset`,
+            the ISO timestamp of the next UTC midnight, when the count restarts.
+
+        Notes:
+            - Calls are counted by `_request`. Without `self.db`, they are counted
+                from the log file instead (see `_logged_calls`).
+            - The first count for a source starts from the log file, so calls made
+                before `_quota` existed aren't lost.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        day = now.date().isoformat()
+        if not self.db:
+            calls_made = self._logged_calls()
+        else:
+            with self.db.lock:
+                self._seed_quota(day)
+                res = self.db.conn.execute(
+                    "SELECT calls FROM _quota WHERE source = ? AND day = ?",
+                    (self.config.get("source"), day),
+                ).fetchone()
+            calls_made = res[0] if res else 0
+        reset = datetime.datetime.combine(
+            now.date() + datetime.timedelta(days=1),
+            datetime.time(),
+            datetime.timezone.utc,
+        )
+        return {
+            "calls_made": calls_made,
+            "calls_remaining": max(0, self.config.get("quota") - calls_made),
+            "reset": reset.isoformat(),
+        }
+
+    def _logged_calls(self) -> int:
+        """Returns the number of quota checks in the log file (see `_calls_made`)."""
+        message = f"_calls_made - {self.config.get('source')}"
+        return util.count_log_lines(message, log_file)
+
+    def _seed_quota(self, day: str) -> None:
+        """Adds today's logged calls to `_quota` if it has no rows for the source yet.
+
+        Notes:
+            Requires `self.db.lock`.
+        """
         source = self.config.get("source")
-        message = f"_calls_made - {source}"
-        self.calls_made = util.count_log_lines(message, log_file)
-        logging.debug(f"{source} - {self.calls_made}")
+        q = "SELECT 1 FROM _quota WHERE source = ? LIMIT 1"
+        if self.db.conn.execute(q, (source,)).fetchone():
+            return None
+        calls = self._logged_calls()
+        if calls:
+            self.db.execute_durable(
+                "INSERT INTO _quota (source, day, calls) VALUES (?, ?, ?)",
+                (source, day, calls),
+            )
+            logging.info(f"{source} - {calls} logged call(s)")
+
+    def _count_call(self) -> None:
+        """Adds a call to today's count in the `_quota` table (if `self.db`)."""
+        if not self.db:
+            return None
+        day = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        with self.db.lock:
+            self._seed_quota(day)
+            self.db.execute_durable(
+                """INSERT INTO _quota (source, day, calls) VALUES (?, ?, 1)
+                ON CONFLICT (source, day) DO UPDATE SET calls = calls + 1""",
+                (self.config.get("source"), day),
+            )
+
+    def _calls_made(self) -> None:
+        """Gets the number of calls already made today (see `quota_status`)."""
+        status = self.quota_status()
+        self.calls_made = status["calls_made"]
+        self.calls_remaining = status["calls_remaining"]
+        logging.debug(f"{self.config.get('source')} - {self.calls_made}")
 
     def _enforce_quota(self) -> bool:
         """Enforces API usage quota."""
         self._calls_made()
-        quota = self.config.get("quota")
-        self.calls_remaining = quota - self.calls_made
-        if self.calls_made >= quota:
+        if self.calls_made >= self.config.get("quota"):
             logging.debug(f"reached {self.calls_made}")
             return True
         else:
@@ -61,8 +195,7 @@ class Call:
 
     def _hash(self) -> None:
         """Makes a hash of a sorted dictionary of parameters."""
-        params = json.dumps(self.config.get("parameters"), sort_keys=True)
-        self.hash = hashlib.blake2b(params.encode()).hexdigest()[:16]
+        self.hash = params_hash(self.config.get("parameters"))
 
     def _wait(self) -> None:
         """Executes wait periods between calls."""
@@ -71,16 +204,33 @@ class Call:
             time.sleep(self.wait)
 
     def _request(self) -> None:
-        """Executes an API call."""
+        """Executes an API call.
+
+        Notes:
+            With an `api_cache` config key, responses are recorded or replayed
+            instead (see `ResponseCache`). Replayed calls don't count towards the
+            quota.
+        """
         self.now = util.now()
         params = self.config.get("parameters")
+        if self.cache and self.cache.mode == "replay":
+            self.response_json = self.cache.replay(params)
+            return None
+        t0 = perf_counter()
         self.response = requests.post(
             self.config["url"], json.dumps(params), timeout=(6.05, 57)
         )
+        self._count_call()
         self._check_response()
+        if self.cache:
+            self.cache.save(params, self.response_json, perf_counter() - t0)
 
     def __init__(self, config=None):
         self.call_n = 0
         self.config_file = config
         secrets = pathlib.Path(config).with_suffix(".secret.yml")
         self.config = _io.load_yaml(config) | _io.load_yaml(secrets)
+        self.db = None
+        self.cache = None
+        if self.config.get("api_cache"):
+            self.cache = ResponseCache(**self.config["api_cache"])
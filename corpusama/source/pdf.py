@@ -1,17 +1,27 @@
 """A module for managing PDF content."""
 
+import hashlib
 import logging
 import pathlib
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 
 import fitz
 import requests
+from requests.adapters import HTTPAdapter
 
 from corpusama.util import parallel
+from corpusama.util.store import TextStore
 
 logger = logging.getLogger(__name__)
 
+# recorded in `_manifest.extractor_version`: bump the last number when changing
+# `extract_text` or `clean_text` so existing TXT files can be re-extracted
+extractor_version = f"pymupdf-{fitz.VersionBind}-1"
+
 
 def clean_text(text: str, drops: str = "�\t") -> str:
     """Removes extra whitespace (multiple blank lines/spaces) and drops.
@@ -33,6 +43,31 @@ def clean_text(text: str, drops: str = "�\t") -> str:
     return text
 
 
+def extract_pages(file: str, start: int = 0, stop: int = None) -> bytes:
+    """Extracts text from a range of PDF pages w/ PyMuPDF (see `extract_text`).
+
+    Args:
+        file: Filepath to a PDF.
+        start: First page index.
+        stop: Page index to stop before (`None` for the last page).
+
+    Notes:
+        Returns undecoded bytes so that ranges can be joined before decoding.
+    """
+    f1 = fitz.TEXTFLAGS_TEXT & fitz.TEXT_DEHYPHENATE & ~fitz.TEXT_PRESERVE_LIGATURES
+    with fitz.open(pathlib.Path(file)) as doc:
+        pages = [
+            b"\n".join(
+                [
+                    x[4].encode(errors="ignore")
+                    for x in page.get_text("blocks", flags=f1)
+                ]
+            )
+            for page in doc.pages(start, stop)
+        ]
+    return b"".join(pages)
+
+
 def extract_text(file: str, clean: bool = True) -> str:
     """ "Extracts text from a PDF file w/ PyMuPDF; optionally cleans text.
 
@@ -49,19 +84,54 @@ def extract_text(file: str, clean: bool = True) -> str:
         - Works for most PDFs, excepting corrupted files, etc.
         - Recognizes multiple columns, tables, text boxes for well-designed files:
             results vary w/ box positioning, etc.
+        - See `ExtractFiles` to extract pages of large files in parallel.
     """
-    file = pathlib.Path(file)
-    doc = fitz.open(file)
-    f1 = fitz.TEXTFLAGS_TEXT & fitz.TEXT_DEHYPHENATE & ~fitz.TEXT_PRESERVE_LIGATURES
-    text = b""
-    for page in doc:
-        text += b"\n".join(
-            [x[4].encode(errors="ignore") for x in page.get_text("blocks", flags=f1)]
-        )
+    text = extract_pages(file).decode()
     if clean:
-        return clean_text(text.decode())
+        return clean_text(text)
     else:
-        return text.decode()
+        return text
+
+
+class SizeError(requests.exceptions.RequestException):
+    """A downloaded file's size differs from the expected size."""
+
+
+def save_response(
+    r: requests.Response, file: str, filesize: int = None, chunk_size: int = 1048576
+) -> dict:
+    """Streams a response's content to a file and returns its `size` and `sha256`.
+
+    Args:
+        r: A response made with `stream=True`.
+        file: Filename.
+        filesize: Expected size in bytes (raises `SizeError` if it differs).
+        chunk_size: Bytes held in memory at a time.
+
+    Notes:
+        Content is written to a hidden `.<name>.part` file in the same directory and
+        renamed to `file` when complete, so `file` is never partially written. If an
+        error occurs, `file` keeps its previous content.
+    """
+    file = pathlib.Path(file)
+    tmp = file.with_name(f".{file.name}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in r.iter_content(chunk_size):
+                size += len(chunk)
+                if filesize and size > filesize:
+                    raise SizeError(f"{r.url} - more than {filesize} bytes")
+                sha256.update(chunk)
+                f.write(chunk)
+        if filesize and size != filesize:
+            raise SizeError(f"{r.url} - {size} bytes != {filesize}")
+        tmp.replace(file)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return {"size": size, "sha256": sha256.hexdigest()}
 
 
 def get_request(file: str, url: str, wait: int = 5) -> str:
@@ -72,15 +142,15 @@ def get_request(file: str, url: str, wait: int = 5) -> str:
         url: Request url.
         wait: Minimum number of seconds to throttle PDF requests (applies only if
             download time < `wait` seconds).
+
+    Notes:
+        Content is streamed to disk (see `save_response`). Nothing is saved for 404s.
     """
-    r = requests.get(url, stream=True, timeout=(6.05, 57))
-    if r.status_code == 404:
-        pass
-    else:
-        r.raise_for_status()
     t0 = time.perf_counter()
-    with open(file, "wb") as f:
-        f.write(r.content)
+    with requests.get(url, stream=True, timeout=(6.05, 57)) as r:
+        if r.status_code != 404:
+            r.raise_for_status()
+            save_response(r, file)
     t1 = time.perf_counter()
     t2 = t1 - t0
     if t2 < wait:
@@ -88,21 +158,210 @@ def get_request(file: str, url: str, wait: int = 5) -> str:
     return r.status_code
 
 
-def _try_extract(file: str, clean: bool, n: int = 0) -> None:
+class RateLimiter:
+    """A thread-safe token bucket limiting requests per host.
+
+    Args:
+        rate: Requests allowed per second for each host.
+        burst: Maximum requests allowed at once after an idle period.
+    """
+
+    def acquire(self, host: str) -> None:
+        """Blocks until a request to `host` is allowed."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0: {rate}")
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+
+class Downloader:
+    """Downloads files concurrently with a shared session, rate limits and retries.
+
+    Args:
+        workers: Number of concurrent downloads.
+        rate: Requests allowed per second for each host (`None` for no limit).
+        retries: Retries per file after a connection error, timeout or `retry_on`
+            status code.
+        backoff: Seconds to wait before the first retry (doubles each retry).
+        retry_on: HTTP status codes to retry.
+        timeout: `(connect, read)` timeouts for `requests`.
+        chunk_size: Bytes held in memory at a time for each download.
+
+    Notes:
+        - Connections are kept alive and reused (pools for up to `workers` hosts,
+            each with `workers` connections).
+        - Each attempt, retries included, waits for the host's `RateLimiter`.
+    """
+
+    def get(
+        self,
+        file: str,
+        url: str,
+        filesize: int = None,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> dict:
+        """Downloads a file and returns its `status`, `size`, `sha256` and validators.
+
+        Args:
+            file: Filename.
+            url: Request url.
+            filesize: Expected size in bytes (see `save_response`).
+            etag: `ETag` of the saved file (sent as `If-None-Match`).
+            last_modified: `Last-Modified` of the saved file (sent as
+                `If-Modified-Since`).
+
+        Notes:
+            - Raises if the final status is an error other than 404 or 304. Nothing
+                is saved for these, and `size` and `sha256` are `None`.
+            - A 304 means the saved file is unchanged: only headers are transferred.
+            - Content is streamed to disk and the hash computed on the fly.
+            - The `etag` and `last_modified` returned are those of the response
+                (or those supplied for a 304).
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.acquire(urlsplit(url).netloc)
+            try:
+                with self.session.get(
+                    url, headers=headers, stream=True, timeout=self.timeout
+                ) as r:
+                    result = {
+                        "status": r.status_code,
+                        "size": None,
+                        "sha256": None,
+                        "etag": r.headers.get("ETag", etag),
+                        "last_modified": r.headers.get("Last-Modified", last_modified),
+                    }
+                    if r.status_code in [304, 404]:
+                        return result
+                    if r.status_code not in self.retry_on:
+                        r.raise_for_status()
+                        return result | save_response(
+                            r, file, filesize, self.chunk_size
+                        )
+                    error = f"status {r.status_code}"
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+            ) as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+            if attempt < self.retries:
+                pause = self.backoff * 2**attempt
+                logger.warning(f"{url} - retry in {pause}s - {error}")
+                time.sleep(pause)
+        r.raise_for_status()
+
+    def run(self, tasks: list):
+        """Downloads tasks and yields `(index, result)` as they finish.
+
+        Args:
+            tasks: Tuples of `get` arguments: `(file, url)` or `(file, url,
+                filesize, etag, last_modified)`.
+
+        Notes:
+            `result` is the dict returned by `get`, or the exception raised if a
+            download failed after retries.
+        """
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = {
+                executor.submit(self.get, *task): x for x, task in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except requests.exceptions.RequestException as e:
+                    yield futures[future], e
+
+    def close(self) -> None:
+        """Closes the session's connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __init__(
+        self,
+        workers: int = 4,
+        rate: float | None = 1,
+        retries: int = 5,
+        backoff: float = 2,
+        retry_on: tuple = (429, 500, 502, 503, 504),
+        timeout: tuple = (6.05, 57),
+        chunk_size: int = 1048576,
+    ):
+        self.workers = workers
+        self.limiter = RateLimiter(rate) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_on = retry_on
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+def _try_extract(
+    file: str, clean: bool, n: int = 0, start: int = None, stop: int = None
+) -> str | bytes | bool:
     """Attempts `extract_text()`, raises a warning on error but doesn't break.
 
     Args:
         file: Filename.
-        url: Request url.
+        clean: Whether to clean text.
         n: An integer that gets logged if an error occurs (managed by containing func).
+        start: First page index of a range (see `extract_pages`).
+        stop: Page index to stop before.
+
+    Returns:
+        The text, the undecoded text of a page range (if `start` is set) or `False`
+        if an error occurred.
     """
     file = pathlib.Path(file)
     try:
-        text = extract_text(file, clean)
-        with open(file.with_suffix(".txt"), "w") as f:
-            f.write(text)
+        if start is not None:
+            return extract_pages(file, start, stop)
+        return extract_text(file, clean)
     except (fitz.FileDataError, RuntimeError, fitz.mupdf.FzErrorFormat) as e:
         logger.warning(f"{n} - {file} - {e}")
+        return False
+
+
+def page_count(file: str) -> int:
+    """Returns the number of pages in a PDF (`0` if it can't be opened)."""
+    try:
+        with fitz.open(pathlib.Path(file)) as doc:
+            return doc.page_count
+    except (fitz.FileDataError, RuntimeError, fitz.mupdf.FzErrorFormat):
+        return 0
 
 
 class ExtractFiles:
@@ -111,26 +370,131 @@ class ExtractFiles:
     Args:
         clean: Whether to clean text after extraction.
         overwrite: Whether to overwrite existing TXT files.
+        page_threshold: Split PDFs with more pages than this into ranges extracted
+            by separate workers (`0` to disable).
+        pages_per_task: Number of pages in each range.
+        size_threshold: Only count the pages of PDFs larger than this (bytes).
+        store: Where to save texts for `<pdf_dir>/<id>/<file_id>.pdf` files (by
+            default, TXT files are saved next to PDFs).
     """
 
-    def run(self, files: list, timeout: int = 30):
+    def _tasks(self, files: list, timeout: int = 30, cores: int = 1) -> list:
+        """Returns `_try_extract` arguments: one task per file or page range.
+
+        Notes:
+            Pages are counted by workers, each file with `timeout` (`0` pages if it
+            times out), and only for files over `size_threshold`.
+        """
+        counts = {}
+        if self.page_threshold:
+            large = [
+                x
+                for x, f in enumerate(files)
+                if f.exists() and f.stat().st_size > self.size_threshold
+            ]
+            args = [(files[x],) for x in large]
+            for i, n_pages, _ in parallel.run_with_timeouts(
+                page_count, args, cores, timeout
+            ):
+                counts[large[i]] = n_pages or 0
+        tasks = []
+        for x, f in enumerate(files):
+            n_pages = counts.get(x, 0)
+            if n_pages > self.page_threshold:
+                for start in range(0, n_pages, self.pages_per_task):
+                    stop = min(start + self.pages_per_task, n_pages)
+                    tasks.append((f, self.clean, x, start, stop))
+            else:
+                tasks.append((f, self.clean, x))
+        return tasks
+
+    def _join(self, parts: list) -> str:
+        """Joins the text of page ranges."""
+        text = b"".join(parts).decode()
+        if self.clean:
+            text = clean_text(text)
+        return text
+
+    def _save(self, file: pathlib.Path, text: str) -> None:
+        """Saves a text in `self.store` or as a TXT file next to the PDF."""
+        if self.store:
+            self.store.write(int(file.parent.name), int(file.stem), text)
+        else:
+            with open(file.with_suffix(".txt"), "w") as f:
+                f.write(text)
+
+    def run(self, files: list, timeout: int = 30, cores: int = 1) -> list:
         """Method to run text extraction on files (saves files in same parent dirs).
 
         Args:
             files: List of PDF filepaths.
-            timeout: Maximum allowed time for PDF extraction.
+            timeout: Maximum allowed time for each PDF extraction (or page range).
+            cores: Number of worker processes (`0` to auto-detect).
+
+        Returns:
+            A dict per file (in order of `files`) with `file`, `seconds` and
+            `extracted` (`False` if an error occurred, `None` if it timed out or
+            crashed its worker).
+
+        Notes:
+            - Workers are reused across files (see `parallel.run_with_timeouts`):
+                only a worker that exceeds `timeout` is restarted.
+            - Pages of files over `size_threshold` are counted first (see
+                `_tasks`). Page ranges are joined in order once all of a file's
+                ranges are extracted. `seconds` is the total for all ranges.
+            - Texts are saved by this process (not workers).
         """
-        n = 0
         files = [pathlib.Path(f) for f in files]
-        for x in range(len(files)):
-            txt_file = files[x].with_suffix(".txt")
-            logger.info(f"{x} - {txt_file}")
-            _ = parallel.run_with_timeout(
-                _try_extract, (files[x], self.clean, n), timeout
-            )
+        tasks = self._tasks(files, timeout, cores)
+        parts = {}
+        for task in [x for x in tasks if len(x) > 3]:
+            parts.setdefault(task[2], {})[task[3]] = None
+        pending = {x: len(v) for x, v in parts.items()}
+        results = [None] * len(files)
+        seconds = [0.0] * len(files)
+        n = 0
+        for i, extracted, t in parallel.run_with_timeouts(
+            _try_extract, tasks, cores, timeout
+        ):
+            x = tasks[i][2]
+            seconds[x] += t
+            if x in parts:
+                parts[x][tasks[i][3]] = extracted
+                pending[x] -= 1
+                if pending[x]:
+                    continue
+                ranges = [parts[x][k] for k in sorted(parts[x])]
+                if all([isinstance(v, bytes) for v in ranges]):
+                    extracted = self._join(ranges)
+                elif False in ranges:
+                    extracted = False
+                else:
+                    extracted = None
+            if isinstance(extracted, str):
+                self._save(files[x], extracted)
+                extracted = True
             n += 1
-        return []
+            txt_file = files[x].with_suffix(".txt")
+            logger.info(f"{n}/{len(files)} - {txt_file} - {round(seconds[x], 2)}s")
+            results[x] = {
+                "file": str(files[x]),
+                "seconds": seconds[x],
+                "extracted": extracted,
+            }
+        return results
 
-    def __init__(self, clean: bool = True, overwrite: bool = False):
+    def __init__(
+        self,
+        clean: bool = True,
+        overwrite: bool = False,
+        page_threshold: int = 200,
+        pages_per_task: int = 50,
+        store: TextStore | None = None,
+        size_threshold: int = 1048576,
+    ):
         self.clean = clean
         self.overwrite = overwrite
+        self.store = store
+        self.page_threshold = page_threshold
+        self.pages_per_task = pages_per_task
+        self.size_threshold = size_threshold
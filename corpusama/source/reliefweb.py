@@ -1,17 +1,20 @@
 """A module for managing ReliefWeb API calls and PDFs."""
 
+import copy
+import json
 import logging
 import math
 import pathlib
 from multiprocessing import cpu_count
 from time import perf_counter
+from typing import Iterator
 
 import pandas as pd
 
 from corpusama.database.database import Database
 from corpusama.source import pdf
-from corpusama.source.call import Call
-from corpusama.util import decorator
+from corpusama.source.call import Call, params_hash
+from corpusama.util import decorator, parallel, store, util
 
 
 class ReliefWeb(Call):
@@ -26,11 +29,12 @@ class ReliefWeb(Call):
                 return True
         logging.debug(self.config.get("parameters").get("offset"))
 
-    def get_all_records(self, stop_at: int = 0) -> None:
+    def get_all_records(self, stop_at: int = 0, prefetch: bool = False) -> None:
         """Makes repeated calls in batches, incrementing the `offset` field.
 
         Args:
             stop_at: The maximum number of calls to make (0 = as many as possible).
+            prefetch: Request the next page while the current one is inserted.
 
         Notes:
             - Makes calls using `self.config["parameters"]`
@@ -41,14 +45,17 @@ class ReliefWeb(Call):
         self.stop_at = stop_at
         if not self.stop_at:
             self.stop_at = self.config.get("quota")
+        if prefetch:
+            return self._prefetch_records()
         while True:
             return self.get_record()
 
-    def get_new_records(self, stop_at: int = 0) -> None:
+    def get_new_records(self, stop_at: int = 0, prefetch: bool = False) -> None:
         """Makes repeated calls starting from the latest `date.changed`.
 
         Args:
             stop_at: The maximum number of calls to make (0 = as many as possible).
+            prefetch: Request the next page while the current one is inserted.
 
         Notes:
             - `self.config["parameters"]` must include `"sort": ["date.changed:asc"]`.
@@ -60,35 +67,59 @@ class ReliefWeb(Call):
         if self.config.get("parameters").get("sort", None) != ["date.changed:asc"]:
             raise ValueError('Add `"sort": ["date.changed:asc"]` to parameters first.')
         self._start_from()
-        self.get_all_records(stop_at)
+        self.get_all_records(stop_at, prefetch)
 
     def _start_from(self):
-        """Updates `filter` to start from the latest `date.changed`."""
-        res = self.db.c.execute("SELECT json_extract(_raw.date,'$.changed') FROM _raw")
-        date_changed = [pd.Timestamp(x[0]) for x in res.fetchall()]
-        if date_changed:
-            latest = pd.Series(date_changed, dtype=object).max().isoformat()
+        """Updates `filter` to start from the latest `date.changed`.
+
+        Notes:
+            The latest `date.changed` is kept for each set of parameters (other
+            than `offset`) in the `_harvest` table. Parameters without a `_harvest`
+            row (e.g., databases harvested before `_harvest` existed) use the
+            indexed maximum from `_raw` instead.
+        """
+        latest = self._high_water_mark()
+        if latest:
             old = self.params_old.get("filter", {}).get("conditions", [])
             new = [{"field": "date.changed", "value": {"from": latest}}]
             update = {"filter": {"operator": "AND", "conditions": old + new}}
             self.config["parameters"] = self.params_old | update
             logging.debug(latest)
 
-    @decorator.while_loop
-    def get_record(self) -> bool:
-        """Makes a single ReliefWeb API call.
-
-        Notes:
-            - Aborts if the daily quota or user-defined stop_at are reached.
-            - Is used as the basic building block for other call methods.
-
-            Wait times for multiple calls are computed based on `wait_dict`
-            and the `totalCount` field from the first API call made. E.g., a
-            `totalCount` of 1000 and a `parameters.stop_at` of 100 means 10 calls
-            need to be made, which defaults to a 5-second wait period.
+    def _high_water_mark(self) -> str | None:
+        """Returns the latest `date.changed` harvested with `self.params_old`."""
+        res = self.db.c.execute(
+            "SELECT date_changed FROM _harvest WHERE params_hash = ?",
+            (params_hash(self.params_old, ["offset"]),),
+        ).fetchone()
+        if res:
+            return res[0]
+        res = self.db.c.execute(
+            "SELECT MAX(json_extract(date, '$.changed')) FROM _raw"
+        ).fetchone()
+        return res[0]
+
+    def _update_high_water_mark(self, page: dict) -> None:
+        """Updates the latest `date.changed` in `_harvest` for a page's records."""
+        changed = [
+            x["fields"].get("date", {}).get("changed")
+            for x in page["response_json"]["data"]
+        ]
+        changed = [x for x in changed if x]
+        if not changed:
+            return None
+        params = {k: v for k, v in self.params_old.items() if k != "offset"}
+        with self.db.lock:
+            self.db.conn.execute(
+                """INSERT INTO _harvest VALUES (?, ?, ?)
+                ON CONFLICT (params_hash) DO UPDATE
+                SET date_changed = MAX(date_changed, excluded.date_changed)""",
+                (params_hash(params), json.dumps(params, sort_keys=True), max(changed)),
+            )
+            self.db._commit(0)
 
-            Inserts data into the `_raw` table after each call.
-        """
+    def _call(self) -> bool:
+        """Makes the next call unless a limit is reached or no results are left."""
         # check whether to abort
         if self.call_n >= self.stop_at:
             logging.debug(f"limit reached {self.stop_at}")
@@ -119,15 +150,68 @@ class ReliefWeb(Call):
         keys = ["time", "took", "totalCount", "count"]
         summary = {k: f"{v:,}" for k, v in self.response_json.items() if k in keys}
         logging.debug(f"{summary}")
-        # store output
+        return True
+
+    def _page(self) -> dict:
+        """Returns the last call's response with the parameters it was made with."""
+        return {
+            "call_n": self.call_n,
+            "now": self.now,
+            "hash": self.hash,
+            "parameters": copy.deepcopy(self.config.get("parameters")),
+            "response_json": self.response_json,
+        }
+
+    def _store(self, page: dict) -> None:
+        """Stores a page in `self.raw` or inserts it into the database (one commit)."""
         if not self.db:
-            self.raw[self.call_n] = self.response_json
+            self.raw[page["call_n"]] = page["response_json"]
         else:
-            self._insert()
+            with self.db.transaction():
+                self._insert(page)
+
+    @decorator.while_loop
+    def get_record(self) -> bool:
+        """Makes a single ReliefWeb API call.
+
+        Notes:
+            - Aborts if the daily quota or user-defined stop_at are reached.
+            - Is used as the basic building block for other call methods.
+
+            Wait times for multiple calls are computed based on `wait_dict`
+            and the `totalCount` field from the first API call made. E.g., a
+            `totalCount` of 1000 and a `parameters.stop_at` of 100 means 10 calls
+            need to be made, which defaults to a 5-second wait period.
+
+            Inserts data into the `_raw` table after each call.
+        """
+        if not self._call():
+            return False
+        self._store(self._page())
         self._wait()
         self.call_n += 1
         return True
 
+    def _pages(self) -> Iterator[dict]:
+        """Yields pages from repeated calls, waiting in between (see `get_record`)."""
+        while self._call():
+            yield self._page()
+            self._wait()
+            self.call_n += 1
+
+    def _prefetch_records(self) -> None:
+        """Makes repeated calls while storing the previous page in this thread.
+
+        Notes:
+            Calls are made in a background thread (see `parallel.pipeline`), which
+            checks `stop_at` and `quota` and waits between calls as `get_record`
+            does. At most a couple of pages are held ahead of `_store`.
+        """
+        timings = parallel.pipeline(
+            self._pages(), self._store, lambda x: None, read_depth=1
+        )
+        logging.info(f"{timings}")
+
     def _get_field_names(self):
         """Makes a set of field names from response data."""
         self.field_names = set()
@@ -136,41 +220,27 @@ class ReliefWeb(Call):
 
         logging.debug(f"{len(self.field_names)} {sorted(self.field_names)}")
 
-    def _insert_log(self):
+    def _insert_log(self, page: dict):
         """Inserts a log entry for a call into the `_log` table."""
         record = {
-            "api_params_hash": self.hash,
-            "api_params": self.config.get("parameters"),
+            "api_params_hash": page["hash"],
+            "api_params": page["parameters"],
             "api_input": "deprecated",
-            "api_date": self.now,
-            "count": self.response_json["count"],
-            "total_count": self.response_json["totalCount"],
+            "api_date": page["now"],
+            "count": page["response_json"]["count"],
+            "total_count": page["response_json"]["totalCount"],
         }
         self.df_log = pd.DataFrame.from_records([record])
         self.db.insert(self.df_log, "_log")
 
     def _insert_pdf(self):
         """Updates the `_pdf` table after each call."""
-        df = self.df_raw.loc[self.df_raw["file"].notna()].copy()
+        df = _pdf_rows(self.df_raw)
         if not df.empty:
-            # make 1 row per file
-            df_flat = pd.json_normalize(df["file"].explode())
-            df_flat.rename(columns={"id": "file_id"}, inplace=True)
-            # add columns
-            ids = [[df.iloc[x]["id"]] * len(df.iloc[x]["file"]) for x in range(len(df))]
-            df_flat["id"] = [x for y in ids for x in y]
-            df_flat = self.db._add_missing_columns(df_flat, "_pdf")
-            # warn for missing columns
-            ignore = [
-                "preview.url-thumb",
-                "preview.url-small",
-                "preview.url-large",
-                "preview.version",
-                "preview.url",
-            ]
-            self._missing_columns(df_flat, "_pdf", ignore)
-            # insert
-            self.db.insert(df_flat, "_pdf")
+            df = self.db._add_missing_columns(df, "_pdf")
+            # warn for missing columns (`preview` has thumbnail URLs)
+            self._missing_columns(df, "_pdf", ["preview"])
+            self.db.insert(df[self.db.tables["_pdf"]], "_pdf")
 
     def _missing_columns(self, df: pd.DataFrame, table: str, ignore: list = []) -> None:
         """Warns if any incoming data lacks a column for a database table.
@@ -185,9 +255,13 @@ class ReliefWeb(Call):
         if missing_cols:
             logging.warning(f"{table} has missing columns: {missing_cols}")
 
-    def _insert(self) -> None:
+    def _insert(self, page: dict | None = None) -> None:
         """Reshapes and inserts ReliefWeb JSON data into a database.
 
+        Args:
+            page: A call's response and parameters (see `_page`), by default the
+                last call made.
+
         Notes:
             - Normalizes JSON data and reshapes to a DataFrame.
             - Replaces `-` with `_` in column names.
@@ -195,8 +269,10 @@ class ReliefWeb(Call):
                 response data.
             - Adds API metadata columns.
         """
+        if page is None:
+            page = self._page()
         # normalize data
-        df = pd.json_normalize(self.response_json["data"], sep="_", max_level=1)
+        df = pd.json_normalize(page["response_json"]["data"], sep="_", max_level=1)
         # manage columns
         df.drop(["fields_id"], axis=1, inplace=True, errors="ignore")
         df.columns = [x.replace("fields_", "") for x in df.columns]
@@ -204,7 +280,7 @@ class ReliefWeb(Call):
             col: col.replace("-", "_").replace(".", "_") for col in df.columns
         }
         df.rename(columns=renamed_columns, inplace=True)
-        df["api_params_hash"] = self.hash
+        df["api_params_hash"] = page["hash"]
         df = self.db._add_missing_columns(df, "_raw")
         # warn for missing columns
         self._missing_columns(df, "_raw", ["score", "vulnerable_groups"])
@@ -212,53 +288,185 @@ class ReliefWeb(Call):
         self.df_raw = df
         if not df.empty:
             self.db.insert(df, "_raw")
-            self._insert_log()
+            self._insert_log(page)
             self._insert_pdf()
+            self._update_high_water_mark(page)
         else:
             logging.info("no more results")
             return None
 
-    def get_pdfs(self, min: int = 0, max: int = 0, wait: int = 5) -> None:
-        """Downloads ReliefWeb PDFs based on records in the _pdf table.
+    def _backfill_manifest(self) -> None:
+        """Adds `_manifest` rows for files saved before the table existed.
+
+        Notes:
+            - Runs only while `_manifest` is empty. Checks the filesystem once for
+                each `_pdf` row: PDFs matching `_pdf.filesize` count as downloaded
+                and TXT files as extracted (at their modification times), or texts
+                in a packed store (at its modification time, see
+                `store.TextStore`). `sha256` and `extractor_version` are left empty.
+            - Other `_pdf` rows get a row with no `downloaded_at` (still to be
+                downloaded), so the check isn't repeated.
+            - Sets missing `_lang.lid_source` values of extracted files to
+                `_manifest.extracted_at`, so files aren't re-identified (see
+                `make_langid`).
+        """
+        if self.db.c.execute("SELECT 1 FROM _manifest LIMIT 1").fetchone():
+            return None
+        df = pd.read_sql("SELECT id, file_id, url, filesize FROM _pdf", self.db.conn)
+        pdf_dir = pathlib.Path(self.config.get("pdf_dir"))
+        texts = store.from_config(self.config)
+        packed_at = None
+        if texts.packed and texts.db_path.exists():
+            packed_at = _timestamp(texts.db_path.stat().st_mtime_ns)
+        records = []
+        for id, file_id, url, filesize in df.itertuples(index=False):
+            file = pdf_dir / str(id) / f"{file_id}.pdf"
+            stat = file.stat() if file.exists() else None
+            if not stat or (pd.notna(filesize) and filesize != stat.st_size):
+                records.append((id, file_id, url, None, None, None))
+                continue
+            txt = file.with_suffix(".txt")
+            extracted_at = None
+            if txt.exists():
+                extracted_at = _timestamp(txt.stat().st_mtime_ns)
+            elif packed_at and texts.exists(id, file_id):
+                extracted_at = packed_at
+            downloaded_at = _timestamp(stat.st_mtime_ns)
+            records.append(
+                (id, file_id, url, stat.st_size, downloaded_at, extracted_at)
+            )
+        with self.db.lock:
+            self.db.c.executemany(
+                """INSERT INTO _manifest (id, file_id, url, size, downloaded_at,
+                extracted_at) VALUES (?, ?, ?, ?, ?, ?)""",
+                records,
+            )
+            sources = self.db.c.execute(
+                """UPDATE _lang SET lid_source = (
+                SELECT extracted_at FROM _manifest
+                WHERE id = _lang.id AND file_id = _lang.file_id)
+                WHERE lid_source IS NULL AND file_id != 0"""
+            ).rowcount
+            self.db._commit(len(records) + sources)
+        logging.info(f"{len(records)} files ({sources} _lang rows checked)")
+
+    def get_pdfs(
+        self,
+        min: int = 0,
+        max: int = 0,
+        wait: float | None = None,
+        workers: int = 4,
+        retries: int = 5,
+        refresh: bool = False,
+    ) -> list:
+        """Downloads ReliefWeb PDFs that are new or changed according to `_manifest`.
 
         Args:
             min: List start index.
             max: List stop index.
-            wait: Minimum seconds to throttle PDF requests (applies if download
-                time < `min_wait`).
+            wait: Minimum seconds between requests to a host (see `pdf.RateLimiter`;
+                `0` for no limit). Defaults to the `pdf_wait` config key or `0.25`.
+            workers: Number of concurrent downloads.
+            retries: Retries per file, with exponential backoff, after connection
+                errors, timeouts and server errors (see `pdf.Downloader`).
+            refresh: Also re-check files already downloaded with conditional
+                requests (see notes).
+
+        Returns:
+            URLs of files that couldn't be downloaded.
 
         Notes:
-            - Compares file sizes of downloaded PDFs with Database _pdf.filesize values
-                and if changed re-downloads file.
-            - Set min and max to run small tests or start from a certain index to ignore
-                already downloaded content.
+            - A `_pdf` row is downloaded if it has no `_manifest` row or if its URL
+                or `filesize` differ from the last download. Downloads of a
+                different size than `_pdf.filesize` are discarded (see
+                `pdf.save_response`).
+            - Failed downloads (404s, or errors after `retries`) are recorded in
+                `_manifest.failed_at` and `error`. Other errors are retried on the
+                next run, but 404s aren't tried again unless the URL changes or
+                `refresh=True`.
+            - `_manifest` records each file's URL, size, SHA-256, download time and
+                HTTP validators (`ETag`, `Last-Modified`). A download with new
+                content resets `extracted_at` (see `extract_pdfs`).
+            - Requests for files already downloaded (same URL and size) send their
+                validators (`If-None-Match`, `If-Modified-Since`): unchanged files
+                return 304 and aren't transferred.
+            - PDFs come from one host, so `wait` caps requests at one every `wait`
+                seconds whatever the number of `workers`. The default (0.25s) allows
+                4 requests per second (14,400 files an hour), so the default 4
+                `workers` can each start a download every second. ReliefWeb only
+                documents limits for API calls (see `quota`), not files.
+            - Set min and max to run small tests or start from a certain index of the
+                files to download.
         """
-        df = pd.read_sql("SELECT * from _pdf", self.db.conn)
-        df["local_file"] = (
-            df["id"].astype(str) + "/" + df["file_id"].astype(str) + ".pdf"
-        )
+        self._backfill_manifest()
+        q = """SELECT _pdf.id, _pdf.file_id, _pdf.url, _pdf.filesize,
+        _manifest.url AS old_url, _manifest.size AS old_size, _manifest.sha256,
+        _manifest.downloaded_at, _manifest.extracted_at, _manifest.extractor_version,
+        _manifest.etag, _manifest.last_modified
+        FROM _pdf LEFT JOIN _manifest
+        ON _pdf.id = _manifest.id AND _pdf.file_id = _manifest.file_id"""
+        if not refresh:
+            q += """ WHERE _manifest.url IS NOT _pdf.url
+            OR (_manifest.error IS NOT '404' AND (_manifest.downloaded_at IS NULL
+            OR (_pdf.filesize IS NOT NULL AND _manifest.size IS NOT _pdf.filesize)))"""
+        df = pd.read_sql(q, self.db.conn)
+        df = df.astype(object).where(df.notna(), None)
         if min > len(df):
             min = len(df)
         if max > len(df) or max == 0:
             max = len(df)
-        logging.info(f"downloading files {min}-{max}")
-        for x in range(min, max):
-            url = df.iloc[x]["url"]
-            file = pathlib.Path(self.config.get("pdf_dir")) / pathlib.Path(
-                df.iloc[x]["local_file"]
-            )
+        logging.info(f"downloading files {min}-{max} ({len(df)} to check)")
+        rows = df.iloc[min:max].to_dict("records")
+        tasks = []
+        for row in rows:
+            file = pathlib.Path(self.config.get("pdf_dir")) / str(row["id"])
+            file = file / f"{row['file_id']}.pdf"
             file.parent.mkdir(parents=True, exist_ok=True)
-            msg = ""
-            if file.exists():
-                # size comparison to determine changed content
-                if df.iloc[x]["filesize"] == file.stat().st_size:
-                    logging.info(f"{x} - skip")
-                else:
-                    msg = pdf.get_request(file, url, wait)
-                    logging.info(f"{x} - {msg}")
+            filesize = int(row["filesize"]) if row["filesize"] is not None else None
+            same = row["old_url"] == row["url"] and file.exists()
+            if filesize is not None and row["old_size"] != filesize:
+                same = False
+            if same:
+                validators = (row["etag"], row["last_modified"])
             else:
-                msg = pdf.get_request(file, url, wait)
-                logging.info(f"{x} - {msg}")
+                validators = (None, None)
+            tasks.append((file, row["url"], filesize, *validators))
+        failed = []
+        records = []
+        n_unchanged = 0
+        t0 = perf_counter()
+        if wait is None:
+            wait = self.config.get("pdf_wait", 0.25)
+        rate = 1 / wait if wait else None
+        with pdf.Downloader(workers, rate, retries) as downloader:
+            for x, result in downloader.run(tasks):
+                if isinstance(result, Exception) or result["status"] == 404:
+                    error = "404" if isinstance(result, dict) else repr(result)
+                    failed.append(tasks[x][1])
+                    records.append(_failed_record(rows[x], error))
+                    logging.warning(f"{tasks[x][0]} - {error}")
+                    continue
+                logging.info(f"{tasks[x][0]} - {result['status']}")
+                if result["status"] == 304:
+                    n_unchanged += 1
+                elif result["sha256"]:
+                    records.append(_manifest_record(rows[x], result))
+                if len(records) >= 100:
+                    self._insert_manifest(records)
+        self._insert_manifest(records)
+        t1 = perf_counter()
+        logging.info(
+            f"{len(tasks)} files: {round(t1-t0, 2)}s "
+            f"({n_unchanged} unchanged, {len(failed)} failed)"
+        )
+        return failed
+
+    def _insert_manifest(self, records: list) -> None:
+        """Inserts/replaces `_manifest` rows and empties `records`."""
+        if records:
+            df = self.db._add_missing_columns(pd.DataFrame(records), "_manifest")
+            self.db.insert(df, "_manifest")
+            records.clear()
 
     def extract_pdfs(
         self,
@@ -267,47 +475,70 @@ class ReliefWeb(Call):
         clean: bool = True,
         overwrite: bool = False,
         timeout: int = 30,
+        cores: int = 0,
+        outdated: bool = False,
+        page_threshold: int = 200,
     ):
-        """Extracts text for PDFs in `ReliefWeb.pdf_dir` and saves to filesystem.
+        """Extracts text for downloaded PDFs and saves to filesystem.
 
         Args:
             self: ReliefWeb object.
             min: Starting list index.
             max: Ending list index.
             clean: Whether to clean text (see `pdf.clean_text`).
-            overwrite: Whether to overwrite if TXT file exists.
+            overwrite: Whether to re-extract every downloaded file.
+            timeout: Maximum seconds allowed to extract each file.
             cores: Cores to run in parallel (use `0` to set automatically).
+            outdated: Also re-extract files extracted with another
+                `pdf.extractor_version`.
+            page_threshold: Extract page ranges of PDFs with more pages than this
+                in parallel (`0` to disable, see `pdf.ExtractFiles`).
 
         Notes:
-            See `pdf.extract_text` for extracting individual files. Collects file
-            list on first execution. Subsequent executions reuse the same file list:
-            changes on filesystem won't be detected unless re-instantiated.
+            - See `pdf.extract_text` for extracting individual files.
+            - Files are listed from `_manifest` (not the filesystem): those never
+                extracted or downloaded again since. Successful extractions update
+                `_manifest.extracted_at` and `extractor_version`.
+            - Texts are saved as TXT files or packed (see `store.TextStore`).
         """
-        # manage files
-        if not self.pdfs:
-            pdf_dir = pathlib.Path(self.config.get("pdf_dir"))
-            pdfs = pdf_dir.rglob("*.pdf")
-            self.pdfs = [f for f in pdfs]
-            logging.info(f"found {len(self.pdfs)} in {pdf_dir}")
-        nfiles = len(self.pdfs)
-        nfiles_total = nfiles
-        if min > nfiles:
-            min = nfiles
-        if max > nfiles or max == 0:
-            max = nfiles
-        pdfs = self.pdfs[min:max]
+        self._backfill_manifest()
+        q = "SELECT id, file_id FROM _manifest WHERE downloaded_at IS NOT NULL"
+        params = []
         if not overwrite:
-            pdfs = [f for f in pdfs if not f.with_suffix(".txt").exists()]
-            nfiles = len(pdfs)
-            logging.info(f"remaining {len(pdfs)} files")
-        else:
-            logging.info(f"overwrite {len(pdfs)} files")
+            q += " AND (extracted_at IS NULL OR extracted_at < downloaded_at"
+            if outdated:
+                q += " OR extractor_version IS NOT ?"
+                params.append(pdf.extractor_version)
+            q += ")"
+        res = self.db.c.execute(q, params).fetchall()
+        nfiles_total = len(res)
+        if min > nfiles_total:
+            min = nfiles_total
+        if max > nfiles_total or max == 0:
+            max = nfiles_total
+        pdf_dir = pathlib.Path(self.config.get("pdf_dir"))
+        pdfs = [pdf_dir / str(id) / f"{file_id}.pdf" for id, file_id in res[min:max]]
+        nfiles = len(pdfs)
+        logging.info(f"extracting {nfiles} files")
         # run extraction
         t0 = perf_counter()
-        extractor = pdf.ExtractFiles(clean, overwrite)
-        _ = extractor.run(pdfs, timeout)
+        texts = store.from_config(self.config)
+        extractor = pdf.ExtractFiles(clean, overwrite, page_threshold, store=texts)
+        results = extractor.run(pdfs, timeout, cores)
         t1 = perf_counter()
         logging.info(f"{nfiles} files: {round(t1-t0, 2)}s ({nfiles_total} total)")
+        extracted = [
+            key for key, x in zip(res[min:max], results) if x and x["extracted"]
+        ]
+        with self.db.lock:
+            self.db.c.executemany(
+                """UPDATE _manifest SET extracted_at = ?, extractor_version = ?
+                WHERE id = ? AND file_id = ?""",
+                [(util.now(), pdf.extractor_version, *key) for key in extracted],
+            )
+            self.db._commit(len(extracted))
+        if len(extracted) < nfiles:
+            logging.warning(f"{nfiles - len(extracted)} files not extracted")
 
     def __init__(
         self,
@@ -315,10 +546,71 @@ class ReliefWeb(Call):
         db: Database,
     ):
         super().__init__(config=config)
-        self.pdfs = None
         self.stop_at = 1
         self.raw = {}
         self.cores = int(cpu_count() / 2)
         self.log = {}
         self.params_old = self.config.get("parameters")
         self.db = db
+
+
+def _manifest_record(row: dict, result: dict) -> dict:
+    """Returns a `_manifest` row for a downloaded file.
+
+    Args:
+        row: The file's `_pdf` row and previous `_manifest` values.
+        result: Returned by `pdf.Downloader.get`.
+
+    Notes:
+        If the content (SHA-256) is unchanged, keeps the previous download time and
+        extraction so the file isn't extracted again.
+    """
+    record = {k: row[k] for k in ["id", "file_id", "url"]}
+    record |= {k: result[k] for k in ["size", "sha256", "etag", "last_modified"]}
+    record["downloaded_at"] = util.now()
+    if row["sha256"] == result["sha256"]:
+        for k in ["downloaded_at", "extracted_at", "extractor_version"]:
+            record[k] = row[k]
+    return record
+
+
+def _failed_record(row: dict, error: str) -> dict:
+    """Returns a `_manifest` row for a file that couldn't be downloaded.
+
+    Args:
+        row: The file's `_pdf` row and previous `_manifest` values.
+        error: `404` or the exception raised.
+
+    Notes:
+        Keeps the previous download of the same URL (if any).
+    """
+    record = {k: row[k] for k in ["id", "file_id", "url"]}
+    if row["old_url"] == row["url"]:
+        record["size"] = row["old_size"]
+        for k in ["sha256", "downloaded_at", "extracted_at", "extractor_version"]:
+            record[k] = row[k]
+        for k in ["etag", "last_modified"]:
+            record[k] = row[k]
+    record["failed_at"] = util.now()
+    record["error"] = error
+    return record
+
+
+def _pdf_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns a DataFrame with a row per file in the `file` column of `_raw` rows.
+
+    Notes:
+        File fields become columns (`id` is renamed `file_id`), `preview` stays a
+        column of dicts, and `id` is the report id.
+    """
+    files = df[["id", "file"]].dropna(subset=["file"]).explode("file")
+    files = files.loc[files["file"].notna()]
+    rows = pd.DataFrame.from_records(files["file"].to_list())
+    rows.rename(columns={"id": "file_id"}, inplace=True)
+    rows["id"] = files["id"].to_numpy()
+    return rows
+
+
+def _timestamp(mtime_ns: int) -> str:
+    """Returns an ISO timestamp (as in `util.now`) for a file modification time."""
+    return pd.Timestamp(mtime_ns, unit="ns", tz="UTC").round("s").isoformat()
@@ -0,0 +1 @@
+"""Synthetic data and a local API stand-in for tests and benchmarks."""
@@ -0,0 +1,323 @@
+"""A local stand-in for the ReliefWeb API `/reports` endpoint and its PDF files.
+
+Serves `synthetic` records for `ReliefWeb.get_new_records` and `get_pdfs` with no
+outside services. API calls (`POST`) support:
+
+- `limit` and `offset`
+- `sort`: `<field>:asc` or `<field>:desc` (e.g., `date.changed:asc`)
+- `filter`: conditions on a `field` with a `value` (matched against values, or their
+    `id`, `name`, `code`, `shortname` or `iso3`) or a range (`from`/`to`, inclusive),
+    nested `conditions` with an `operator` (`AND`/`OR`) and `negate`. Other objects
+    match on any of their values (e.g., `date` on `created`, `changed` or `original`)
+
+`query` and `profile` are ignored. Responses have `totalCount`, `count` and `data`.
+PDF URLs point at the server (`GET`), which returns `filesize` bytes with an `ETag`.
+Run from the repository root:
+
+    python -m corpusama.testing.stand_in serve --records 100000 --latency 0.5
+    python -m corpusama.testing.stand_in harvest --records 5000 --latency 0.2 --prefetch
+"""
+
+import datetime
+import functools
+import json
+import pathlib
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import click
+import pandas as pd
+
+from corpusama.database.database import Database
+from corpusama.source.reliefweb import ReliefWeb
+from corpusama.testing import synthetic
+
+# subfields matched when a condition's field has objects (e.g., `language`)
+subfields = ["id", "name", "code", "shortname", "iso3"]
+
+
+def _values(fields: dict, field: str) -> list:
+    """Returns the values of a (dotted) field, e.g., `date.changed`."""
+    values = [fields]
+    for key in field.split("."):
+        values = [x for v in values for x in (v if isinstance(v, list) else [v])]
+        values = [v[key] for v in values if isinstance(v, dict) and key in v]
+    values = [x for v in values for x in (v if isinstance(v, list) else [v])]
+    flat = []
+    for v in values:
+        if isinstance(v, dict):
+            flat += [v[k] for k in subfields if k in v] or list(v.values())
+        else:
+            flat.append(v)
+    return flat
+
+
+def _comparable(value):
+    """Returns a value as a number, datetime or lowercase string."""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return str(value).lower()
+
+
+def match(fields: dict, condition: dict) -> bool:
+    """Returns whether a record's fields match a filter condition."""
+    if "conditions" in condition:
+        results = [match(fields, x) for x in condition["conditions"]]
+        if condition.get("operator", "AND").upper() == "OR":
+            matched = any(results)
+        else:
+            matched = all(results)
+    else:
+        values = [_comparable(x) for x in _values(fields, condition["field"])]
+        value = condition.get("value")
+        if isinstance(value, dict):
+            low = _comparable(value["from"]) if "from" in value else None
+            high = _comparable(value["to"]) if "to" in value else None
+            matched = any(
+                (low is None or x >= low) and (high is None or x <= high)
+                for x in values
+            )
+        else:
+            wanted = value if isinstance(value, list) else [value]
+            wanted = [_comparable(x) for x in wanted]
+            matched = any(x in wanted for x in values)
+    return not matched if condition.get("negate") else matched
+
+
+class StandIn:
+    """Serves synthetic ReliefWeb records and PDFs from a local HTTP server.
+
+    Args:
+        records: Number of records (ids `1` to `records`).
+        latency: Seconds added to each API call.
+        pdf_latency: Seconds added to each PDF download.
+        pdf_size: Size of every PDF in bytes (default: random `filesize` values
+            from `synthetic.record`).
+        seed: Random seed.
+        kwargs: Passed to `synthetic.record` (e.g., `paragraphs`, `max_files`).
+
+    Notes:
+        - `url` is the API endpoint once started. `requests` lists the
+            `(perf_counter(), path, offset)` of each request (`offset` is `None`
+            for PDFs).
+        - Use as a context manager to start and stop the server.
+    """
+
+    def record(self, id: int) -> dict:
+        """Returns the full record for an id."""
+        record = synthetic.record(id, self.seed, base_url=self.base_url, **self.kwargs)
+        if self.pdf_size:
+            for file in record["fields"].get("file", []):
+                file["filesize"] = self.pdf_size
+        return record
+
+    @functools.cached_property
+    def index(self) -> list:
+        """Record fields without `body-html`, used to filter and sort."""
+        index = []
+        for id in range(1, self.records + 1):
+            fields = self.record(id)["fields"]
+            fields.pop("body-html", None)
+            index.append(fields)
+        return index
+
+    def search(self, params: dict) -> dict:
+        """Returns an API response for call parameters."""
+        t0 = perf_counter()
+        index = self.index
+        if params.get("filter"):
+            index = [x for x in index if match(x, params["filter"])]
+        for sort in reversed(params.get("sort", [])):
+            field, _, order = sort.partition(":")
+            index = sorted(
+                index,
+                key=lambda x: [_comparable(v) for v in _values(x, field)],
+                reverse=order == "desc",
+            )
+        offset = params.get("offset", 0)
+        ids = [x["id"] for x in index[offset : offset + params.get("limit", 10)]]
+        return {
+            "time": round((perf_counter() - t0) * 1000),
+            "totalCount": len(index),
+            "count": len(ids),
+            "data": [self.record(x) for x in ids],
+        }
+
+    def pdf(self, path: str) -> bytes | None:
+        """Returns the body of a PDF URL path or `None` if not found."""
+        found = re.fullmatch(r"/attachments/(\d+)/\d+-(\d+)\.pdf", path)
+        if not found or not 0 < int(found[1]) <= self.records:
+            return None
+        files = self.record(int(found[1]))["fields"].get("file", [])
+        if int(found[2]) >= len(files):
+            return None
+        filesize = files[int(found[2])]["filesize"]
+        return b"%PDF" + b"0" * (filesize - 4)
+
+    def _handler(self) -> type:
+        """Returns a request handler class bound to this stand-in."""
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                params = json.loads(self.rfile.read(length) or "{}")
+                stand_in.requests.append(
+                    (perf_counter(), self.path, params.get("offset", 0))
+                )
+                time.sleep(stand_in.latency)
+                body = json.dumps(stand_in.search(params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stand_in.requests.append((perf_counter(), self.path, None))
+                time.sleep(stand_in.pdf_latency)
+                body = stand_in.pdf(self.path)
+                etag = f'"{self.path.rsplit("/", 1)[-1]}"'
+                if body is None:
+                    self.send_response(404)
+                    body = b""
+                elif self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                else:
+                    self.send_response(200)
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> str:
+        """Starts the server in a background thread and returns the API URL."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.url = f"{self.base_url}/v1/reports"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        """Stops the server."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __init__(
+        self,
+        records: int,
+        latency: float = 0.0,
+        pdf_latency: float = 0.0,
+        pdf_size: int | None = None,
+        seed: int = 0,
+        **kwargs,
+    ):
+        self.records = records
+        self.latency = latency
+        self.pdf_latency = pdf_latency
+        self.pdf_size = pdf_size
+        self.seed = seed
+        self.kwargs = kwargs
+        self.requests = []
+        self.server = None
+        self.base_url = "https://reliefweb.int"
+        self.url = None
+
+
+@click.group()
+def main():
+    """Runs a local stand-in for the ReliefWeb API."""
+
+
+@main.command()
+@click.option("--records", default=10000, show_default=True, help="Records served.")
+@click.option("--latency", default=0.2, show_default=True, help="API call delay (s).")
+@click.option("--pdf-latency", default=0.05, show_default=True, help="PDF delay (s).")
+@click.option("--pdf-size", default=None, type=int, help="Bytes per PDF.")
+def serve(records: int, latency: float, pdf_latency: float, pdf_size: int | None):
+    """Serves records until interrupted."""
+    with StandIn(records, latency, pdf_latency, pdf_size) as stand_in:
+        click.echo(f"{len(stand_in.index)} records at {stand_in.url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+@main.command()
+@click.option("--records", default=5000, show_default=True, help="Records served.")
+@click.option("--limit", default=1000, show_default=True, help="Records per call.")
+@click.option("--latency", default=0.2, show_default=True, help="API call delay (s).")
+@click.option("--pdf-latency", default=0.05, show_default=True, help="PDF delay (s).")
+@click.option("--pdf-size", default=100000, show_default=True, help="Bytes per PDF.")
+@click.option("--workers", default=4, show_default=True, help="PDF downloads.")
+@click.option("--prefetch", is_flag=True, help="Prefetch the next API page.")
+def harvest(
+    records: int,
+    limit: int,
+    latency: float,
+    pdf_latency: float,
+    pdf_size: int,
+    workers: int,
+    prefetch: bool,
+):
+    """Measures `get_new_records` and `get_pdfs` throughput."""
+    with StandIn(
+        records, latency, pdf_latency, pdf_size
+    ) as stand_in, tempfile.TemporaryDirectory() as tmp:
+        stand_in.index
+        params = {"limit": limit, "offset": 0, "sort": ["date.changed:asc"]}
+        config = synthetic.config(tmp, url=stand_in.url, parameters=params)
+        job = ReliefWeb(config, Database(config))
+        job._set_wait = lambda manual=None: setattr(job, "wait", 0)
+        t0 = perf_counter()
+        job.get_new_records(prefetch=prefetch)
+        t_records = perf_counter() - t0
+        t0 = perf_counter()
+        failed = job.get_pdfs(wait=0.001, workers=workers)
+        t_pdfs = perf_counter() - t0
+        n_records = job.db.c.execute("SELECT COUNT(*) FROM _raw").fetchone()[0]
+        n_files = job.db.c.execute("SELECT COUNT(*) FROM _manifest").fetchone()[0]
+        size = sum(x.stat().st_size for x in pathlib.Path(tmp).glob("pdf/*/*.pdf"))
+        job.db.close_db()
+    results = [
+        {"stage": "get_new_records", "items": n_records, "seconds": t_records},
+        {"stage": "get_pdfs", "items": n_files, "seconds": t_pdfs},
+    ]
+    df = pd.DataFrame(results)
+    df["items/s"] = df["items"] / df["seconds"]
+    df["MB/s"] = [None, size / 1e6 / t_pdfs]
+    click.echo(f"{records} records, {latency}s/call, {pdf_latency}s/PDF")
+    click.echo(f"prefetch: {prefetch}, workers: {workers}, failed: {len(failed)}")
+    click.echo(df.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
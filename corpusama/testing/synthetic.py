@@ -0,0 +1,152 @@
+"""Generates synthetic ReliefWeb-shaped records for benchmarks and tests.
+
+Records mimic the structure of ReliefWeb API `/reports` responses (`profile: full`)
+closely enough to exercise the same code paths as real data. Content is random but
+reproducible for a given `seed`.
+"""
+
+import pathlib
+import random
+import string
+
+import pandas as pd
+import yaml
+
+from corpusama.util import io as _io
+
+languages = [
+    {"id": 267, "name": "English", "code": "en"},
+    {"id": 268, "name": "French", "code": "fr"},
+    {"id": 269, "name": "Spanish", "code": "es"},
+]
+countries = ["AFG", "COD", "HTI", "MOZ", "PHL", "SDN", "SYR", "UKR", "YEM"]
+formats = ["Analysis", "Appeal", "News and Press Release", "Situation Report"]
+themes = ["Agriculture", "Food and Nutrition", "Health", "Shelter and Non-Food Items"]
+
+
+def _words(rng: random.Random, n: int) -> str:
+    """Returns a string of `n` random lowercase words."""
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        for _ in range(n)
+    )
+
+
+def _html(rng: random.Random, paragraphs: int) -> str:
+    """Returns an HTML body with random paragraphs."""
+    return "\n".join(
+        f"<p>{_words(rng, rng.randint(40, 120))}</p>" for _ in range(paragraphs)
+    )
+
+
+def record(
+    id: int,
+    seed: int = 0,
+    paragraphs: int = 8,
+    max_files: int = 2,
+    base_url: str = "https://reliefweb.int",
+) -> dict:
+    """Returns one API-style record (`{"id": ..., "fields": {...}}`).
+
+    Args:
+        id: Report id.
+        seed: Random seed (combined with `id`).
+        paragraphs: Number of HTML paragraphs in `body-html`.
+        max_files: Maximum number of PDF attachments.
+        base_url: Host used for report and PDF URLs.
+    """
+    rng = random.Random(seed * 1000003 + id)
+    day = pd.Timestamp("2000-01-01", tz="UTC") + pd.Timedelta(days=id % 9000)
+    changed = day + pd.Timedelta(seconds=id)
+    lang = rng.choice(languages)
+    files = [
+        {
+            "id": id * 10 + x,
+            "description": _words(rng, 3),
+            "filename": f"{id}-{x}.pdf",
+            "filesize": rng.randint(10000, 5000000),
+            "url": f"{base_url}/attachments/{id}/{id}-{x}.pdf",
+            "mimetype": "application/pdf",
+            "preview": {"url": f"{base_url}/preview/{id}-{x}.png", "version": "1"},
+        }
+        for x in range(rng.randint(0, max_files))
+    ]
+    fields = {
+        "id": id,
+        "title": _words(rng, 8).capitalize(),
+        "status": "published",
+        "url": f"{base_url}/node/{id}",
+        "url_alias": f"{base_url}/report/{id}",
+        "origin": f"{base_url}/origin/{id}",
+        "body-html": _html(rng, paragraphs),
+        "date": {
+            "created": day.isoformat(),
+            "changed": changed.isoformat(),
+            "original": day.isoformat(),
+        },
+        "language": [lang],
+        "country": [
+            {"id": x, "iso3": c.lower(), "shortname": c, "name": c}
+            for x, c in enumerate(rng.sample(countries, rng.randint(1, 3)))
+        ],
+        "primary_country": {"id": 1, "iso3": "afg", "shortname": "AFG"},
+        "source": [{"id": 1, "name": _words(rng, 3), "shortname": "SRC"}],
+        "format": [{"id": 1, "name": rng.choice(formats)}],
+        "theme": [{"id": x, "name": t} for x, t in enumerate(rng.sample(themes, 2))],
+    }
+    if files:
+        fields["file"] = files
+    return {"id": str(id), "score": 1, "fields": fields}
+
+
+def records(n: int, start: int = 1, seed: int = 0, **kwargs) -> list:
+    """Returns a list of `n` API-style records with ids from `start`.
+
+    Args:
+        n: Number of records.
+        start: First report id.
+        seed: Random seed.
+        kwargs: Passed to `synthetic.record`.
+    """
+    return [record(x, seed, **kwargs) for x in range(start, start + n)]
+
+
+def raw_df(n: int, start: int = 1, seed: int = 0, **kwargs) -> pd.DataFrame:
+    """Returns a DataFrame of records shaped like `ReliefWeb._insert` output.
+
+    Args:
+        n: Number of records.
+        start: First report id.
+        seed: Random seed.
+        kwargs: Passed to `synthetic.record`.
+    """
+    df = pd.json_normalize(records(n, start, seed, **kwargs), sep="_", max_level=1)
+    df.drop(["fields_id", "score"], axis=1, inplace=True, errors="ignore")
+    df.columns = [
+        x.replace("fields_", "").replace("-", "_").replace(".", "_") for x in df.columns
+    ]
+    df["id"] = df["id"].astype(int)
+    df["api_params_hash"] = "synthetic"
+    return df
+
+
+def config(directory: str, **kwargs) -> str:
+    """Writes a corpus config (and empty secrets file) and returns its filepath.
+
+    Args:
+        directory: Where to write config files and the database.
+        kwargs: Config keys to add/override (e.g., `db_profile="wal"`).
+    """
+    directory = pathlib.Path(directory)
+    settings = _io.load_yaml("test/config-example.yml")
+    settings |= {
+        "db_name": str(directory / "synthetic.db"),
+        "pdf_dir": str(directory / "pdf") + "/",
+    }
+    settings |= kwargs
+    file = directory / "synthetic.yml"
+    with open(file, "w") as f:
+        yaml.safe_dump(settings, f)
+    with open(file.with_suffix(".secret.yml"), "w") as f:
+        f.write("{}\n")
+    return str(file)
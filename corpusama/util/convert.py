@@ -70,6 +70,51 @@ def nan_to_none(
     return series
 
 
+def _to_sql_value(item: object, nan_strings: set) -> object:
+    """Converts a value as `to_json_or_str` and `nan_to_none` would for SQLite."""
+    if item is None or item is pd.NA or item is pd.NaT:
+        return None
+    if isinstance(item, np.generic):
+        item = item.item()
+    if isinstance(item, (list, dict)):
+        return json.dumps(item)
+    if isinstance(item, bytes):
+        return item
+    if isinstance(item, float) and item != item:
+        return None
+    if isinstance(item, (int, float)) and not isinstance(item, bool):
+        return item
+    item = str(item).strip()
+    if not item or item.lower() in nan_strings:
+        return None
+    return item
+
+
+def to_sql_values(
+    series: pd.Series, nan_strings: list = ["none", "null", "nan"]
+) -> list:
+    """Returns a list of values of a series to insert into SQLite.
+
+    Args:
+        series: A series to process.
+        nan_strings: Strings to consider as `None` values (case insensitive).
+
+    Notes:
+        - Stores the same values as `to_json_or_str` then `nan_to_none` (column
+            affinity converts numbers and numeric strings alike) with less work.
+        - Integer columns are used as-is and float columns only have NaN replaced.
+            Values in other columns are converted one by one: lists/dicts to JSON,
+            numbers and `bytes` kept, strings stripped, others to `str`, and NaN,
+            empty strings or `nan_strings` to `None`.
+    """
+    if pd.api.types.is_integer_dtype(series.dtype) and not series.hasnans:
+        return series.tolist()
+    if pd.api.types.is_float_dtype(series.dtype):
+        return series.astype(object).where(series.notna(), None).tolist()
+    nan_strings = {x.lower() for x in nan_strings}
+    return [_to_sql_value(x, nan_strings) for x in series.tolist()]
+
+
 def empty_list_to_none(item: list) -> None:
     """Converts an empty list to `None`, otherwise returns as-is."""
     if isinstance(item, list):
@@ -1,6 +1,13 @@
+"""Functions and classes for multiprocessing."""
 import logging
-from multiprocessing import Pool, TimeoutError, cpu_count
-from typing import Callable
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import Pool, TimeoutError, cpu_count, get_context
+from multiprocessing.connection import wait
+from time import perf_counter
+from typing import Callable, Iterable
 
 import numpy as np
 import pandas as pd
@@ -50,26 +57,389 @@ def limit_cores(cores: int, ls: list) -> int:
     return cores
 
 
-def run(iterable: iter, func: Callable, cores: int) -> iter:
+def _split(iterable: iter, cores: int) -> list:
+    """Splits an iterable into 1 chunk per core."""
+    if not isinstance(iterable, (pd.DataFrame, list)):
+        raise TypeError(f"Type {type(iterable)} not implemented for ``parallel.run``")
+    return np.array_split(iterable, cores)
+
+
+def _combine(iterable: iter, results: list) -> iter:
+    """Combines the results of a function run on split chunks of ``iterable``."""
+    if isinstance(iterable, pd.DataFrame):
+        return pd.concat(results)
+    else:
+        return list(np.concatenate(results))
+
+
+def run(iterable: iter, func: Callable, cores: int, executor=None) -> iter:
     """Splits an iterable into 1 chunk per core and runs a function in parallel.
 
     Args:
         iterable: E.g., a ``list`` or ``DataFrame``.
         func: Function to execute (returns modified iterable).
-        cores: Number of cores to use."""
+        cores: Number of cores to use.
+        executor: An ``Executor`` to reuse (otherwise a new pool is made)."""
 
-    _split = np.array_split(iterable, cores)
-    pool = Pool(cores)
-    if isinstance(iterable, pd.DataFrame):
-        iterable = pd.concat(pool.map(func, _split))
-    elif isinstance(iterable, list):
-        iterable = np.concatenate(pool.map(func, _split))
-        iterable = list(iterable)
+    if executor:
+        return executor.run(iterable, func)
+    with Executor(cores) as executor:
+        return executor.run(iterable, func)
+
+
+class Executor:
+    """A long-lived process pool to run functions on many chunks of data.
+
+    Args:
+        cores: Number of worker processes (``0`` to auto-detect, see ``set_cores``).
+        start_method: ``fork``, ``spawn`` or ``forkserver`` (``None`` uses the
+            platform default).
+        initializer: Function each worker runs once on startup (e.g., to import
+            modules or load models).
+        initargs: Arguments for ``initializer``.
+        maxtasksperchild: Replace workers after N tasks (``None`` keeps them alive).
+
+    Notes:
+        - Use as a context manager: workers are closed and joined on exit, or
+            terminated if an exception occurred.
+        - Reuse one ``Executor`` across chunks and stages to avoid paying for
+            process startup and imports each time.
+        - Workers start on the first ``run`` with data to process (empty inputs
+            are returned as-is).
+
+    Example:
+        ```py
+        with parallel.Executor(4) as executor:
+            for df in chunks:
+                df = executor.run(df, func)
+        ```
+    """
+
+    def run(self, iterable: iter, func: Callable) -> iter:
+        """Splits an iterable into 1 chunk per worker and runs a function on each.
+
+        Args:
+            iterable: E.g., a ``list`` or ``DataFrame``.
+            func: Function to execute (returns modified iterable).
+        """
+        if self.closed:
+            raise ValueError("Executor is closed")
+        if not len(iterable):
+            return iterable
+        if not self.pool:
+            self._start()
+        results = self.pool.map(func, _split(iterable, self.cores))
+        self.n_tasks += self.cores
+        return _combine(iterable, results)
+
+    def _start(self) -> None:
+        """Starts the worker processes."""
+        context = get_context(self.start_method)
+        self.pool = context.Pool(
+            self.cores, self.initializer, self.initargs, self.maxtasksperchild
+        )
+        logger.debug(f"{self.cores} {context.get_start_method()}")
+
+    def close(self) -> None:
+        """Waits for tasks to finish and stops workers."""
+        self.closed = True
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            logger.debug(f"{self.n_tasks} tasks")
+
+    def terminate(self) -> None:
+        """Stops workers immediately."""
+        self.closed = True
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.terminate()
+        else:
+            self.close()
+
+    def __init__(
+        self,
+        cores: int = 0,
+        start_method: str | None = None,
+        initializer: Callable | None = None,
+        initargs: tuple = (),
+        maxtasksperchild: int | None = None,
+    ):
+        self.cores = max(1, set_cores(cores))
+        self.start_method = start_method
+        self.initializer = initializer
+        self.initargs = initargs
+        self.maxtasksperchild = maxtasksperchild
+        self.n_tasks = 0
+        self.pool = None
+        self.closed = False
+
+
+@contextmanager
+def use_executor(executor: Executor | None, cores: int = 0, **kwargs):
+    """Yields ``executor`` if supplied, otherwise a new one closed on exit.
+
+    Args:
+        executor: An ``Executor`` owned by the caller (left open) or ``None``.
+        cores: Number of cores for a new ``Executor``.
+        kwargs: Other arguments for a new ``Executor``.
+    """
+    if executor:
+        yield executor
     else:
-        raise TypeError(f"Type {type(iterable)} not implemented for ``parallel.run``")
-    pool.close()
-    pool.join()
-    return iterable
+        with Executor(cores, **kwargs) as executor:
+            yield executor
+
+
+class _Stage(threading.Thread):
+    """A background thread that puts/gets items to/from bounded queues."""
+
+    def run(self):
+        try:
+            self.target()
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
+    def __init__(self, target: Callable, stop: threading.Event, name: str):
+        super().__init__(name=name, daemon=True)
+        self.target = target
+        self.stop = stop
+        self.error = None
+
+
+_done = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Puts an item in a queue unless ``stop`` is set first."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Gets an item from a queue, or ``_done`` if ``stop`` is set first."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _done
+
+
+def pipeline(
+    chunks: Iterable,
+    func: Callable,
+    write: Callable,
+    read_depth: int = 2,
+    write_depth: int = 2,
+) -> dict:
+    """Reads, processes and writes chunks with each stage running concurrently.
+
+    Args:
+        chunks: An iterable of chunks (e.g., from ``pd.read_sql(..., chunksize=N)``),
+            consumed in a reader thread.
+        func: Function run on each chunk in the calling thread (e.g.,
+            ``executor.run``). Results that are ``None`` are skipped.
+        write: Function run on each result in a writer thread, in order.
+        read_depth: Maximum number of chunks read ahead of ``func``.
+        write_depth: Maximum number of results waiting for ``write``.
+
+    Returns:
+        Seconds spent in each stage (``read``, ``process``, ``write``), waiting
+        for a chunk (``wait``) and in total, plus the number of ``chunks``.
+
+    Notes:
+        - While ``func`` processes a chunk, the next ones are read and the previous
+            ones written. Queue depths bound how many chunks are held in memory.
+        - An exception in any stage stops the others and is raised here.
+        - ``chunks`` and ``write`` run in other threads: an SQLite connection they
+            use must allow it (see ``Database.open_db``).
+    """
+    stop = threading.Event()
+    read_q = queue.Queue(read_depth)
+    write_q = queue.Queue(write_depth)
+    timings = {"read": 0.0, "process": 0.0, "write": 0.0, "wait": 0.0, "chunks": 0}
+
+    def _read():
+        it = iter(chunks)
+        while not stop.is_set():
+            t0 = perf_counter()
+            chunk = next(it, _done)
+            timings["read"] += perf_counter() - t0
+            if not _put(read_q, chunk, stop) or chunk is _done:
+                return
+
+    def _write():
+        while True:
+            try:
+                result = write_q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if result is _done:
+                return
+            t0 = perf_counter()
+            write(result)
+            timings["write"] += perf_counter() - t0
+
+    t_start = perf_counter()
+    reader = _Stage(_read, stop, "pipeline-read")
+    writer = _Stage(_write, stop, "pipeline-write")
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            t0 = perf_counter()
+            chunk = _get(read_q, stop)
+            timings["wait"] += perf_counter() - t0
+            if chunk is _done:
+                break
+            t0 = perf_counter()
+            result = func(chunk)
+            timings["process"] += perf_counter() - t0
+            timings["chunks"] += 1
+            if result is not None and not _put(write_q, result, stop):
+                break
+        _put(write_q, _done, stop)
+        writer.join()
+    finally:
+        stop.set()
+        reader.join()
+        writer.join()
+    for stage in [reader, writer]:
+        if stage.error:
+            raise stage.error
+    timings["total"] = perf_counter() - t_start
+    timings = {k: round(v, 3) for k, v in timings.items()}
+    logger.debug(timings)
+    return timings
+
+
+def _work(func: Callable, conn) -> None:
+    """Runs ``func`` on each ``(index, args)`` task received until ``None``."""
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        i, args = task
+        t0 = perf_counter()
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, repr(e)
+        conn.send((i, result, perf_counter() - t0, error))
+
+
+class _Worker:
+    """A worker process with its own pipe, so it can be killed independently."""
+
+    def submit(self, i: int, args: tuple) -> None:
+        self.conn.send((i, args))
+        self.task = i
+        self.t0 = perf_counter()
+
+    def stop(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.conn.send(None)
+                self.process.join(1)
+            except (BrokenPipeError, OSError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def __init__(self, context, func: Callable):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_work, args=(func, child), daemon=True)
+        self.process.start()
+        child.close()
+        self.task = None
+        self.t0 = None
+
+
+def run_with_timeouts(
+    func: Callable,
+    args: list,
+    cores: int = 0,
+    timeout: float = 30,
+    start_method: str | None = None,
+):
+    """Runs a function on many sets of arguments, each with a timeout.
+
+    Args:
+        func: A function (must be picklable for ``spawn``).
+        args: List of argument tuples, one per task.
+        cores: Number of worker processes (``0`` to auto-detect, see ``set_cores``).
+        timeout: Maximum seconds allowed for each task.
+        start_method: ``fork``, ``spawn`` or ``forkserver`` (``None`` uses the
+            platform default).
+
+    Yields:
+        ``(index, result, seconds)`` for each task as it finishes, where ``index`` is
+        its position in ``args``. ``result`` is ``None`` if the task timed out,
+        raised an error or killed its worker (a warning is logged).
+
+    Notes:
+        - Workers stay alive across tasks. Only a worker that exceeds ``timeout``
+            (or dies) is killed and replaced.
+        - Results are yielded in order of completion, not of ``args``.
+    """
+    context = get_context(start_method)
+    pending = deque(enumerate(args))
+    n_workers = limit_cores(max(1, set_cores(cores)), args)
+    workers = [_Worker(context, func) for x in range(n_workers)]
+    try:
+        while True:
+            for worker in [w for w in workers if w.task is None]:
+                if pending:
+                    worker.submit(*pending.popleft())
+            busy = {w.conn: w for w in workers if w.task is not None}
+            if not busy:
+                break
+            deadline = min([w.t0 for w in busy.values()]) + timeout
+            ready = wait(list(busy), max(0, deadline - perf_counter()))
+            for conn in ready:
+                worker = busy[conn]
+                try:
+                    i, result, seconds, error = conn.recv()
+                except EOFError:
+                    i, result, seconds = worker.task, None, perf_counter() - worker.t0
+                    error = f"worker exit code {worker.process.exitcode}"
+                    workers[workers.index(worker)] = _Worker(context, func)
+                    worker.stop(kill=True)
+                if error:
+                    logger.warning(f"{i} - {error}")
+                worker.task = None
+                yield i, result, seconds
+            now = perf_counter()
+            for worker in [w for w in busy.values() if w.conn not in ready]:
+                if now - worker.t0 >= timeout:
+                    i = worker.task
+                    worker.stop(kill=True)
+                    workers[workers.index(worker)] = _Worker(context, func)
+                    logger.warning(f"{i} - timeout")
+                    yield i, None, now - worker.t0
+    finally:
+        for worker in workers:
+            worker.stop()
 
 
 def run_with_timeout(func: Callable, args: tuple, timeout: int = 5):
@@ -0,0 +1,149 @@
+"""Reads and writes texts extracted from files (e.g., PDFs) by `id` and `file_id`.
+
+Texts are saved either as `<pdf_dir>/<id>/<file_id>.txt` files (default) or packed
+into a single compressed SQLite file, set with the `text_store` config key:
+
+    ```yaml
+    text_store:
+      packed: true        # save texts in `<pdf_dir>/text.db`
+      compression: lzma   # `lzma` (xz) or `zlib`
+    ```
+"""
+
+import logging
+import lzma
+import pathlib
+import sqlite3 as sql
+import zlib
+
+logger = logging.getLogger(__name__)
+
+compressors = {
+    "lzma": (lambda x: lzma.compress(x, preset=1), lzma.decompress),
+    "zlib": (zlib.compress, zlib.decompress),
+}
+
+
+class TextStore:
+    """Accessor for extracted texts in TXT files or a packed database.
+
+    Args:
+        pdf_dir: Directory with `<id>/<file_id>.pdf` files.
+        packed: Save texts in `<pdf_dir>/text.db` instead of TXT files.
+        compression: Compression used for packed texts (see `store.compressors`).
+
+    Notes:
+        - The packed database connection is opened on first use in each process,
+            so a `TextStore` can be sent to worker processes.
+        - Only one process should write at a time.
+    """
+
+    def path(self, id: int, file_id: int) -> pathlib.Path:
+        """Returns the TXT filepath for a text (used when not `packed`)."""
+        return self.pdf_dir / str(id) / f"{file_id}.txt"
+
+    def read(self, id: int, file_id: int) -> str | None:
+        """Returns a text or `None` if not found."""
+        if not self.packed:
+            file = self.path(id, file_id)
+            if not file.exists():
+                return None
+            with open(file) as f:
+                return f.read()
+        res = self._connect().execute(
+            "SELECT compression, text FROM _text WHERE id = ? AND file_id = ?",
+            (int(id), int(file_id)),
+        )
+        row = res.fetchone()
+        if not row:
+            return None
+        return compressors[row[0]][1](row[1]).decode()
+
+    def write(self, id: int, file_id: int, text: str) -> None:
+        """Saves a text (replaces an existing one)."""
+        if not self.packed:
+            with open(self.path(id, file_id), "w") as f:
+                f.write(text)
+            return None
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO _text VALUES (?, ?, ?, ?)",
+            (int(id), int(file_id), self.compression, self._compress(text)),
+        )
+        conn.commit()
+
+    def exists(self, id: int, file_id: int) -> bool:
+        """Returns whether a text exists."""
+        if not self.packed:
+            return self.path(id, file_id).exists()
+        res = self._connect().execute(
+            "SELECT 1 FROM _text WHERE id = ? AND file_id = ?", (int(id), int(file_id))
+        )
+        return res.fetchone() is not None
+
+    def pack_files(self, remove: bool = False) -> int:
+        """Copies existing `<id>/<file_id>.txt` files into the packed database.
+
+        Args:
+            remove: Delete TXT files once packed.
+
+        Returns:
+            Number of texts packed.
+        """
+        if not self.packed:
+            raise ValueError("TextStore isn't packed")
+        n = 0
+        for file in self.pdf_dir.glob("*/*.txt"):
+            if not (file.parent.name.isdigit() and file.stem.isdigit()):
+                continue
+            with open(file) as f:
+                self.write(int(file.parent.name), int(file.stem), f.read())
+            if remove:
+                file.unlink()
+            n += 1
+        logger.info(f"{n} files - {self.db_path}")
+        return n
+
+    def _compress(self, text: str) -> bytes:
+        """Returns a text compressed with `self.compression`."""
+        return compressors[self.compression][0](text.encode())
+
+    def _connect(self) -> sql.Connection:
+        """Returns this process's connection to the packed database."""
+        if not self.conn:
+            self.pdf_dir.mkdir(parents=True, exist_ok=True)
+            self.conn = sql.connect(self.db_path, timeout=60)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS _text (
+                'id' INTEGER NOT NULL,
+                'file_id' INTEGER NOT NULL,
+                'compression' TEXT NOT NULL,
+                'text' BLOB NOT NULL,
+                PRIMARY KEY ('id', 'file_id')
+                ) WITHOUT ROWID"""
+            )
+        return self.conn
+
+    def close(self) -> None:
+        """Closes the packed database connection (reopened if used again)."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __getstate__(self):
+        return self.__dict__ | {"conn": None}
+
+    def __init__(self, pdf_dir: str, packed: bool = False, compression: str = "lzma"):
+        if compression not in compressors:
+            raise ValueError(f"compression {compression} not in {list(compressors)}")
+        self.pdf_dir = pathlib.Path(pdf_dir)
+        self.packed = packed
+        self.compression = compression
+        self.db_path = self.pdf_dir / "text.db"
+        self.conn = None
+
+
+def from_config(config: dict) -> TextStore:
+    """Returns a `TextStore` for a corpus config (`pdf_dir` and `text_store` keys)."""
+    return TextStore(config.get("pdf_dir"), **config.get("text_store", {}))
@@ -1,11 +1,9 @@
 #!/usr/bin/env python3
 import re
 import sys
-from time import sleep
-
-import requests
 
 from corpusama.corpus.corpus import Corpus
+from corpusama.util import parallel
 
 if __name__ == "__main__":
     # format dates
@@ -34,46 +32,36 @@ if __name__ == "__main__":
 
     # update sqlite database
     print(f"... get records: {new_filter}")
-    corp.rw.get_new_records()
+    corp.rw.get_new_records(prefetch=True)
 
-    # download associated PDFs, retry to handle known errors
-    n_retries = 0
-    max_retries = 20
-    pause = 60
-    success = False
+    # download associated PDFs (retries with backoff for each file)
     print("... get PDFs")
-    while n_retries < max_retries:
-        try:
-            corp.rw.get_pdfs()
-            print("... success")
-            success = True
-            n_retries = max_retries
-        except (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.ReadTimeout,
-        ) as e:
-            n_retries += 1
-            print(f"... retrying after {pause} seconds: {e}")
-            sleep(pause)
-    if not success:
-        raise Warning("reached maximum number of retries: check exceptions")
+    failed = corp.rw.get_pdfs()
+    if failed:
+        print(f"... {len(failed)} PDFs not downloaded: check logs")
 
     # extract PDF text to TXT file in same location
     corp.rw.extract_pdfs()
 
     # run language identification
     print("... identify languages")
-    corp.make_langid("_pdf")
-    corp.make_langid("_raw")
+    corp.make_langid("_pdf", incremental=True)
+    corp.make_langid("_raw", incremental=True)
 
-    # make corpus XML <doc> attributes for languages
-    print("... generate attributes")
-    corp.make_attribute("es")
-    corp.make_attribute("fr")
-    corp.make_attribute("en")
+    # reuse worker processes for attribute and export stages
+    with parallel.Executor() as executor:
+        # make corpus XML <doc> attributes for languages
+        print("... generate attributes")
+        for lang in ["es", "fr", "en"]:
+            corp.make_attribute(lang, incremental=True, executor=executor)
 
-    # export the XML-tagged texts in chunks
-    print("... export corpora")
-    corp.export_text("es", start_date=start_date[:10], end_date=end_date[:10])
-    corp.export_text("fr", start_date=start_date[:10], end_date=end_date[:10])
-    corp.export_text("en", start_date=start_date[:10], end_date=end_date[:10])
+        # export the XML-tagged texts in chunks (full exports: the shell pipeline
+        # builds corpora from every `reliefweb_<lang>*.txt` file)
+        print("... export corpora")
+        for lang in ["es", "fr", "en"]:
+            corp.export_text(
+                lang,
+                start_date=start_date[:10],
+                end_date=end_date[:10],
+                executor=executor,
+            )
@@ -1,8 +1,13 @@
+import pathlib
 import unittest
+from types import SimpleNamespace
 
 import pandas as pd
 
 from corpusama.corpus import attribute
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+from corpusama.util import io as _io
 from corpusama.util.util import now
 
 
@@ -57,6 +62,38 @@ class Test_Attribute(unittest.TestCase):
         attribute._add_years(df2)
         self.assertEqual(result["date__col__year"][0], df2["date__col__year"][0])
 
+    def test_make_attribute_incremental(self):
+        db = Database(self.config_file)
+        config = _io.load_yaml("config/reliefweb_2000+.yml")
+        corp = SimpleNamespace(db=db, config=config)
+        df = db._add_missing_columns(synthetic.raw_df(5), "_raw")
+        db.insert(df, "_raw")
+        lang = pd.DataFrame({"id": range(1, 6), "file_id": 0, "lid": [{"en": 1.0}] * 5})
+        lang["lang_date"] = now()
+        db.insert(db._add_missing_columns(lang, "_lang"), "_lang")
+        q = "SELECT id, doc_tag FROM _attr ORDER BY id"
+
+        def make(**kwargs):
+            attribute.make_attribute(corp, "en", cores=1, incremental=True, **kwargs)
+            return dict(db.c.execute(q).fetchall())
+
+        self.assertEqual(len(make()), 5)
+        db.c.execute("UPDATE _attr SET doc_tag = 'old'")
+        # unchanged rows are skipped
+        self.assertEqual(set(make().values()), {"old"})
+        # rows with a newer date.changed are regenerated
+        db.c.execute(
+            """UPDATE _raw SET date = json_set(date, '$.changed', '2100-01-01')
+            WHERE id = 2"""
+        )
+        tags = make()
+        self.assertTrue(tags[2].startswith('<doc id="2"'))
+        self.assertEqual(tags[1], "old")
+        # changing settings regenerates everything
+        self.assertNotIn("old", make(years=False).values())
+        db.close_db()
+        pathlib.Path(db.config.get("db_name")).unlink(missing_ok=True)
+
 
 # def test_export_attribute(self):
 #     # FIXME still requires default attribute.yaml file to exist
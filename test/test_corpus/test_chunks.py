@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+
+import pandas as pd
+
+from corpusama.corpus import chunks
+from corpusama.database.database import Database
+from corpusama.source.reliefweb import _pdf_rows
+from corpusama.testing import synthetic
+
+
+class Test_Chunks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(synthetic.config(self.tmp.name))
+        df = synthetic.raw_df(5, max_files=1)
+        self.db.insert(self.db._add_missing_columns(df.copy(), "_raw"), "_raw")
+        self.db.insert(_pdf_rows(df)[self.db.tables["_pdf"]], "_pdf")
+        self.db.c.execute(
+            """INSERT INTO _manifest (id, file_id, extracted_at)
+            SELECT id, file_id, '2024-01-01' FROM _pdf"""
+        )
+
+    def tearDown(self):
+        self.db.close_db()
+        self.tmp.cleanup()
+
+    def ids(self, table: str, incremental: bool = True) -> list:
+        """Returns the ids selected for `make_langid`."""
+        dfs = list(chunks.langid_chunks(self.db, table, 2, incremental))
+        return sorted(pd.concat(dfs)["id"]) if dfs else []
+
+    def add_lang(self, table: str) -> None:
+        """Saves selected rows to `_lang` as `make_langid` would."""
+        for df in chunks.langid_chunks(self.db, table, 2, True):
+            if table == "_raw":
+                df["file_id"] = 0
+            df = df[["id", "file_id", "lid_source"]].assign(lid='{"en": 1.0}')
+            df["lang_date"] = "2024-01-01"
+            self.db.insert(self.db._add_missing_columns(df, "_lang"), "_lang")
+
+    def test_langid_chunks_raw(self):
+        self.assertEqual(self.ids("_raw"), [1, 2, 3, 4, 5])
+        self.add_lang("_raw")
+        self.assertEqual(self.ids("_raw"), [])
+        self.assertEqual(self.ids("_raw", incremental=False), [1, 2, 3, 4, 5])
+        # a changed record and a result from another version of it
+        self.db.c.execute(
+            """UPDATE _raw SET date = json_set(date, '$.changed', '2030-01-01')
+            WHERE id = 2"""
+        )
+        self.db.c.execute("UPDATE _lang SET lid_source = 'x' WHERE id = 4")
+        self.assertEqual(self.ids("_raw"), [2, 4])
+
+    def test_langid_chunks_pdf(self):
+        files = self.db.c.execute("SELECT id FROM _pdf ORDER BY id").fetchall()
+        files = [x[0] for x in files]
+        self.assertEqual(self.ids("_pdf"), files)
+        self.add_lang("_pdf")
+        self.assertEqual(self.ids("_pdf"), [])
+        # re-extracted, or not extracted
+        self.db.c.execute(
+            f"UPDATE _manifest SET extracted_at = '2030-01-01' WHERE id = {files[0]}"
+        )
+        self.db.c.execute(
+            f"UPDATE _manifest SET extracted_at = NULL WHERE id = {files[-1]}"
+        )
+        self.assertEqual(self.ids("_pdf"), files[:1])
+        self.assertEqual(self.ids("_pdf", incremental=False), files)
+        with self.assertRaises(ValueError):
+            self.ids("_lang")
+
+    def test_langid_chunks_pdf_no_manifest(self):
+        self.db.c.execute("DELETE FROM _manifest")
+        files = self.db.c.execute("SELECT id FROM _pdf ORDER BY id").fetchall()
+        df = pd.concat(chunks.langid_chunks(self.db, "_pdf", 2, False))
+        self.assertEqual(sorted(df["id"]), [x[0] for x in files])
+        self.assertTrue(df["lid_source"].isna().all())
+        self.assertEqual(self.ids("_pdf"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import pathlib
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import pandas as pd
+
+from corpusama.corpus import export
+from corpusama.database.database import Database
+from corpusama.testing import synthetic
+from corpusama.util import store
+from corpusama.util.util import now
+
+
+class Test_Export(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(synthetic.config(self.tmp.name))
+        self.corp = SimpleNamespace(db=self.db, config=self.db.config)
+        self.run = 0
+        df = self.db._add_missing_columns(synthetic.raw_df(3), "_raw")
+        self.db.insert(df, "_raw")
+        lang = pd.DataFrame({"id": [1, 2, 3], "file_id": 0, "lid": [{"en": 1.0}] * 3})
+        lang["lang_date"] = now()
+        self.db.insert(self.db._add_missing_columns(lang, "_lang"), "_lang")
+        attr = pd.DataFrame({"id": [1, 2, 3]})
+        attr["doc_tag"] = attr["id"].apply(
+            lambda x: f'<doc id="{x}" file_id="FILE_ID">'
+        )
+        self.db.insert(self.db._add_missing_columns(attr, "_attr"), "_attr")
+
+    def tearDown(self):
+        self.db.close_db()
+        self.tmp.cleanup()
+
+    def export(self) -> tuple:
+        """Runs a delta export and returns (exported doc tags, tombstone ids)."""
+        self.run += 1
+        run = pathlib.Path(self.tmp.name) / str(self.run)
+        run.mkdir()
+        export.export_text(self.corp, "en", stem=f"{run}/rw", cores=1, delta=True)
+        docs = []
+        for shard in run.glob("*.txt"):
+            with open(shard) as f:
+                docs.extend([x for x in f.read().split("\n") if x.startswith("<doc")])
+        tombstones = pd.read_csv(next(run.glob("*.tombstones.tsv")), sep="\t")
+        return sorted(docs), sorted(tombstones["id"])
+
+    def test_export_text_delta(self):
+        docs, tombstones = self.export()
+        self.assertEqual(len(docs), 3)
+        self.assertEqual(tombstones, [])
+        # nothing new
+        self.assertEqual(self.export(), ([], []))
+        # one changed, one no longer in language
+        self.db.c.execute("UPDATE _raw SET body_html = '<p>new</p>' WHERE id = 2")
+        self.db.c.execute("""UPDATE _lang SET lid = '{"fr": 1.0}' WHERE id = 3""")
+        docs, tombstones = self.export()
+        self.assertEqual(docs, ['<doc id="2" file_id="0">'])
+        self.assertEqual(tombstones, [2, 3])
+        q = "SELECT id FROM _export WHERE lang = 'en' ORDER BY id"
+        self.assertEqual(self.db.c.execute(q).fetchall(), [(1,), (2,)])
+
+    def test_export_text_packed(self):
+        self.db.config["text_store"] = {"packed": True}
+        texts = store.from_config(self.db.config)
+        texts.write(1, 10, "Text from a PDF.")
+        lang = pd.DataFrame({"id": [1], "file_id": 10, "lid": [{"en": 1.0}]})
+        lang["lang_date"] = now()
+        self.db.insert(self.db._add_missing_columns(lang, "_lang"), "_lang")
+        docs, _ = self.export()
+        self.assertIn('<doc id="1" file_id="10">', docs)
+        with open(next(pathlib.Path(self.tmp.name, "1").glob("*.1.txt"))) as f:
+            self.assertIn("Text from a PDF.", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,36 @@
+import importlib.util
 import pathlib
+import sqlite3
+import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
 
+from corpusama.database import database, snapshot
 from corpusama.database.database import Database
+from corpusama.testing import synthetic
 
 
 class Test_Database(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.table_names = sorted(["_attr", "_lang", "_log", "_pdf", "_raw"])
+        cls.table_names = sorted(
+            [
+                "_attr",
+                "_export",
+                "_harvest",
+                "_lang",
+                "_lid",
+                "_log",
+                "_manifest",
+                "_pdf",
+                "_quota",
+                "_raw",
+                "_snapshot",
+                "_zdict",
+            ]
+        )
         cls.config_file = "test/config-example.yml"
 
     def tearDown(self):
@@ -34,6 +55,214 @@ class Test_Database(unittest.TestCase):
         df = pd.read_sql("SELECT * from _log", self.db.conn)
         self.assertTrue(len(df) == 3)
 
+    def test_insert_typed(self):
+        """Typed and string conversions store the same values and types."""
+        self.db = Database(self.config_file)
+        values = [" text ", "", "NULL", None, np.nan, {"a": 1}, [1, None], 5, 1.5]
+        n = len(values)
+        df = pd.DataFrame(
+            {
+                "id": range(n),
+                "file_id": range(n),
+                "description": values,
+                "filename": [f" {x}.pdf" for x in range(n)],
+                "filesize": [1.0, np.nan] * 4 + [3.0],
+                "url": [f"{x}.pdf" for x in range(n)],
+                "mimetype": pd.to_datetime(["2024-01-01"] * n, utc=True),
+            }
+        )
+        q = "SELECT *, typeof(description), typeof(filesize) FROM _pdf ORDER BY id"
+        results = []
+        for typed in [True, False]:
+            self.db.insert(df, "_pdf", typed)
+            results.append(self.db.c.execute(q).fetchall())
+            self.db.c.execute("DELETE FROM _pdf")
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0][0][2:5], ("text", "0.pdf", 1))
+        self.assertEqual([x[2] for x in results[0][1:5]], [None] * 4)
+
+    def test_transaction(self):
+        self.db = Database(self.config_file)
+        other = sqlite3.connect(self.db.path)
+
+        def insert(ids: list):
+            df = pd.DataFrame({"id": ids, "doc_tag": "<doc>"})
+            self.db.insert(self.db._add_missing_columns(df, "_attr"), "_attr")
+
+        def count() -> int:
+            return other.execute("SELECT COUNT(*) FROM _attr").fetchone()[0]
+
+        with self.db.transaction():
+            insert([1, 2])
+            with self.db.transaction(1):
+                insert([3])
+            self.assertEqual(count(), 0)
+        self.assertEqual(count(), 3)
+        with self.db.transaction(commit_every=2):
+            insert([4])
+            self.assertEqual(count(), 3)
+            insert([5])
+            self.assertEqual(count(), 5)
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                insert([6])
+                raise ValueError
+        self.assertEqual(count(), 5)
+        other.close()
+
+    def test_compress(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        config = synthetic.config(tmp.name, compress={"_raw.body_html": "zlib"})
+        self.db = Database(config)
+        df = self.db._add_missing_columns(synthetic.raw_df(50), "_raw")
+        self.db.insert(df, "_raw")
+        q = "SELECT typeof(body_html), decompress(body_html) FROM _raw ORDER BY id"
+        res = self.db.c.execute(q).fetchall()
+        self.assertEqual({x[0] for x in res}, {"blob"})
+        self.assertEqual([x[1] for x in res], df["body_html"].str.strip().to_list())
+        size = "SELECT SUM(length(body_html)) FROM _raw"
+        plain = self.db.c.execute(size).fetchone()[0]
+        # a trained dictionary, kept when reopened
+        self.assertEqual(self.db.train_dictionary(samples=20), 1)
+        self.assertEqual(self.db.recompress(chunksize=20), 50)
+        self.assertLess(self.db.c.execute(size).fetchone()[0], plain)
+        self.db.close_db()
+        self.db = Database(config)
+        self.assertEqual(self.db.c.execute(q).fetchall(), res)
+        # lzma, then uncompressed
+        for codec in ["lzma", "none"]:
+            self.db.compression = {"_raw.body_html": codec}
+            self.db.recompress()
+            self.assertEqual(self.db.c.execute(q).fetchall()[0][1], res[0][1])
+        types = self.db.c.execute("SELECT DISTINCT typeof(body_html) FROM _raw")
+        self.assertEqual(types.fetchall(), [("text",)])
+        self.db.close_db()
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_snapshot(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = Database(synthetic.config(tmp.name))
+        df = self.db._add_missing_columns(synthetic.raw_df(20), "_raw")
+        self.db.insert(df, "_raw")
+        lang = pd.DataFrame({"id": df["id"], "file_id": 0, "lid": [{"en": 1.0}] * 20})
+        lang["lang_date"] = "2024-01-01"
+        self.db.insert(self.db._add_missing_columns(lang, "_lang"), "_lang")
+        attr = pd.DataFrame({"id": df["id"], "doc_tag": "<doc>", "attr_config": "a"})
+        attr["attr_source"] = "2024-01-01"
+        self.db.insert(attr, "_attr")
+        self.db.c.execute(
+            """UPDATE _raw SET date = json_set(date, '$.original', '2001-05-01')
+            WHERE id > 15"""
+        )
+        path = f"{tmp.name}/snapshot"
+        tables = ["_raw", "_lang"]
+        self.assertEqual(self.db.snapshot(path, tables), {"_raw": 2, "_lang": 2})
+        # a new `make_attribute` run
+        self.assertEqual(self.db.snapshot(path, ["_attr"]), {"_attr": 2})
+        self.db.c.execute("UPDATE _attr SET attr_config = 'b' WHERE id = 16")
+        self.assertEqual(self.db.snapshot(path, ["_attr"]), {"_attr": 1})
+        raw = snapshot.read(path, "_raw")
+        self.assertEqual(sorted(raw["id"]), list(range(1, 21)))
+        self.assertEqual(
+            raw.groupby("year")["id"].count().to_dict(), {2000: 15, 2001: 5}
+        )
+        self.assertIn("country__name", raw.columns)
+        self.assertTrue(raw["body_html"].str.startswith("<p>").all())
+        lang = snapshot.read(path, "_lang", years=[2001], columns=["id", "lid__en"])
+        self.assertEqual(lang["lid__en"].to_list(), [1.0] * 5)
+        # only changed years are rewritten, empty ones removed
+        self.assertEqual(self.db.snapshot(path, tables), {"_raw": 0, "_lang": 0})
+        self.db.c.execute(
+            """UPDATE _raw SET date = json_set(date, '$.changed', '2030-01-01')
+            WHERE id = 1"""
+        )
+        self.assertEqual(self.db.snapshot(path, tables), {"_raw": 1, "_lang": 1})
+        self.db.c.execute("DELETE FROM _lang WHERE id > 15")
+        self.assertEqual(self.db.snapshot(path, tables), {"_raw": 0, "_lang": 0})
+        self.assertEqual(len(snapshot.read(path, "_lang")), 15)
+        self.assertFalse(pathlib.Path(path, "_lang", "year=2001").exists())
+        self.assertEqual(
+            self.db.snapshot(path, tables, full=True), {"_raw": 2, "_lang": 1}
+        )
+        self.db.close_db()
+
+    def test_profile(self):
+        self.db = Database(self.config_file)
+        self.db.close_db()
+        self.db.pragmas = database.get_profile("wal")
+        self.db.open_db()
+        mode = self.db.c.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+        sync = self.db.c.execute("PRAGMA synchronous").fetchone()[0]
+        self.assertEqual(sync, 1)
+
+    def test_get_profile(self):
+        self.db = Database(self.config_file)
+        self.assertEqual(database.get_profile(None), {})
+        custom = database.get_profile({"profile": "wal", "synchronous": "FULL"})
+        self.assertEqual(custom["synchronous"], "FULL")
+        self.assertEqual(custom["journal_mode"], "WAL")
+        with self.assertRaises(ValueError):
+            database.get_profile({"locking_mode": "EXCLUSIVE"})
+        with self.assertRaises(ValueError):
+            database.get_profile({"cache_size": "1; DROP TABLE _raw"})
+
+    def test_expression_indexes(self):
+        self.db = Database(self.config_file)
+        plans = {
+            "_raw_date_changed": """SELECT id FROM _raw
+            WHERE json_extract(date, '$.changed') > '2020-01-01'""",
+            "_raw_date_original": """SELECT id FROM _raw
+            WHERE DATE(json_extract(date, '$.original')) BETWEEN '2020' AND '2021'""",
+            "_lid_lang_share": """SELECT id FROM _lid
+            WHERE lang = 'en' AND share >= 0.8""",
+        }
+        for index, query in plans.items():
+            plan = self.db.c.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+            self.assertIn(index, str(plan))
+
+    def test_lid_sync(self):
+        self.db = Database(self.config_file)
+        df = pd.DataFrame(
+            {
+                "id": [1, 1, 2],
+                "file_id": [0, 10, 0],
+                "lang_date": ["2024-01-01"] * 3,
+                "lid": [{"en": 0.8, "fr": 0.2}, {"fr": 1.0}, None],
+            }
+        )
+        df = self.db._add_missing_columns(df, "_lang")
+        self.db.insert(df, "_lang")
+        q = "SELECT id, file_id, lang, share FROM _lid ORDER BY id, file_id, lang"
+        ref = [(1, 0, "en", 0.8), (1, 0, "fr", 0.2), (1, 10, "fr", 1.0)]
+        self.assertEqual(self.db.c.execute(q).fetchall(), ref)
+        # replacing rows replaces shares
+        self.db.insert(df.iloc[:1].assign(lid=[{"es": 1.0}]), "_lang")
+        ref = [(1, 0, "es", 1.0), (1, 10, "fr", 1.0)]
+        self.assertEqual(self.db.c.execute(q).fetchall(), ref)
+        self.db.c.execute("DELETE FROM _lang WHERE file_id = 10")
+        self.assertEqual(self.db.c.execute(q).fetchall(), ref[:1])
+
+    def test_migrate_fills_lid(self):
+        self.db = Database(self.config_file)
+        self.db.c.execute(
+            """INSERT INTO _lang (id, file_id, lang_date, lid)
+            VALUES (1, 0, '2024-01-01', '{"en": 1.0}')"""
+        )
+        self.db.c.execute("DELETE FROM _lid")
+        self.db.migrate()
+        lid = self.db.c.execute("SELECT lang, share FROM _lid").fetchall()
+        self.assertEqual(lid, [("en", 1.0)])
+
+    def test_migrate_adds_columns(self):
+        self.db = Database(self.config_file)
+        self.db.c.execute("ALTER TABLE _lang DROP COLUMN lid_source")
+        self.db.migrate()
+        res = self.db.c.execute("pragma table_info(_lang)").fetchall()
+        self.assertIn("lid_source", [x[1] for x in res])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,8 @@
+import tempfile
+import time
 import unittest
 
-from corpusama.source.call import Call
+from corpusama.source.call import Call, ResponseCache
 
 # TODO testing other methods requires writing up integration testing
 
@@ -29,5 +31,36 @@ class Test_Call(unittest.TestCase):
                 self.assertNotEqual(self.job.wait, int(k))
 
 
+class Test_ResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.params = {"limit": 10, "offset": 0, "query": {"value": "flood"}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_replay(self):
+        cache = ResponseCache(self.tmp.name, "record")
+        for offset in [0, 10]:
+            params = self.params | {"offset": offset}
+            cache.save(params, {"count": 10, "offset": offset}, 0.2)
+        # same hash directory, one file per offset
+        files = sorted(cache.dir.glob("*/*.json.xz"))
+        self.assertEqual([x.name for x in files], ["0.json.xz", "10.json.xz"])
+        self.assertEqual(files[0].parent, files[1].parent)
+        cache = ResponseCache(self.tmp.name, "replay", timing=0.5)
+        t0 = time.perf_counter()
+        response = cache.replay(self.params | {"offset": 10})
+        self.assertGreaterEqual(time.perf_counter() - t0, 0.1)
+        self.assertEqual(response, {"count": 10, "offset": 10})
+
+    def test_replay_missing(self):
+        cache = ResponseCache(self.tmp.name)
+        with self.assertRaises(FileNotFoundError):
+            cache.replay(self.params)
+        with self.assertRaises(ValueError):
+            ResponseCache(self.tmp.name, "other")
+
+
 if __name__ == "__main__":
     unittest.main()
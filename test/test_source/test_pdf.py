@@ -1,11 +1,56 @@
+import hashlib
 import pathlib
+import tempfile
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import fitz
 
 from corpusama.source import pdf
 
 
+class _Handler(BaseHTTPRequestHandler):
+    """Serves `/<n>.pdf`; `/flaky.pdf` fails once with 503, `/missing.pdf` 404s."""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.path == "/missing.pdf":
+            self.send_error(404)
+            return
+        if self.path == "/flaky.pdf" and self.requests.count(self.path) == 1:
+            self.send_error(503)
+            return
+        body = f"%PDF {self.path}".encode()
+        etag = f'"{len(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_pdf(file: str, pages: int) -> None:
+    """Writes a PDF with a numbered paragraph on each page."""
+    doc = fitz.open()
+    for x in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {x} lorem ipsum dolor sit amet.")
+        page.insert_text((72, 144), f"Second block on page {x}.")
+    doc.save(file)
+    doc.close()
+
+
 class TestPDF(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -24,6 +69,61 @@ class TestPDF(unittest.TestCase):
         clean = pdf.clean_text(text)
         self.assertEqual(clean, ref)
 
+    def test_rate_limiter(self):
+        limiter = pdf.RateLimiter(20)
+        t0 = time.perf_counter()
+        for x in range(5):
+            limiter.acquire("a")
+        limiter.acquire("b")
+        self.assertGreaterEqual(time.perf_counter() - t0, 4 / 20)
+        with self.assertRaises(ValueError):
+            pdf.RateLimiter(0)
+
+    def test_downloader(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+        names = ["1.pdf", "2.pdf", "3.pdf", "flaky.pdf", "missing.pdf"]
+        with tempfile.TemporaryDirectory() as tmp:
+            tasks = [(pathlib.Path(tmp) / x, f"{url}/{x}") for x in names]
+            tasks[0] += (len(b"%PDF /1.pdf"),)
+            tasks[1] += (100,)
+            with pdf.Downloader(3, rate=100, retries=2, backoff=0.01) as downloader:
+                results = dict(downloader.run(tasks))
+            with open(tasks[3][0], "rb") as f:
+                content = f.read()
+            files = sorted([x.name for x in pathlib.Path(tmp).iterdir()])
+        server.shutdown()
+        server.server_close()
+        self.assertEqual(content, b"%PDF /flaky.pdf")
+        self.assertEqual(results[3]["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(results[3]["size"], len(content))
+        self.assertIsInstance(results[1], pdf.SizeError)
+        statuses = [results[x]["status"] for x in [0, 2, 3, 4]]
+        self.assertListEqual(statuses, [200, 200, 200, 404])
+        self.assertListEqual(files, ["1.pdf", "3.pdf", "flaky.pdf"])
+        self.assertEqual(_Handler.requests.count("/flaky.pdf"), 2)
+        self.assertEqual(results[0]["etag"], '"11"')
+
+    def test_downloader_not_modified(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/1.pdf"
+        with tempfile.TemporaryDirectory() as tmp:
+            file = pathlib.Path(tmp) / "1.pdf"
+            with pdf.Downloader(1, rate=100) as downloader:
+                etag = downloader.get(file, url)["etag"]
+                mtime = file.stat().st_mtime_ns
+                result = downloader.get(file, url, None, etag)
+                self.assertEqual(file.stat().st_mtime_ns, mtime)
+                changed = downloader.get(file, url, None, '"0"')
+        server.shutdown()
+        server.server_close()
+        self.assertEqual(result["status"], 304)
+        self.assertEqual(result["etag"], etag)
+        self.assertIsNone(result["sha256"])
+        self.assertEqual(changed["status"], 200)
+
     def test_extract_text(self):
         text = pdf.extract_text("test/test_source/sample.pdf")
         # check text
@@ -46,11 +146,37 @@ class TestPDF(unittest.TestCase):
         # shouldn't raise an error
         pdf._try_extract("test/test_source/sample-corrupt.pdf", True)
 
+    def test_extract_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = pathlib.Path(tmp) / "pages.pdf"
+            make_pdf(file, 5)
+            text = pdf.extract_text(file, clean=False)
+            parts = [pdf.extract_pages(file, x, x + 2) for x in range(0, 5, 2)]
+            self.assertEqual(pdf.page_count(file), 5)
+        self.assertEqual(b"".join(parts).decode(), text)
+        self.assertIn("Page 4 lorem", text)
+
+    def test_ExtractFiles_page_ranges(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = [pathlib.Path(tmp) / f"{x}.pdf" for x in range(2)]
+            make_pdf(files[0], 7)
+            make_pdf(files[1], 2)
+            extractor = pdf.ExtractFiles(page_threshold=3, pages_per_task=2)
+            self.assertEqual(len(extractor._tasks(files)), 2)
+            extractor.size_threshold = 0
+            self.assertEqual(len(extractor._tasks(files)), 5)
+            results = extractor.run(files, 5, 2)
+            with open(files[0].with_suffix(".txt")) as f:
+                text = f.read()
+            self.assertEqual(text, pdf.extract_text(files[0]))
+        self.assertListEqual([x["extracted"] for x in results], [True, True])
+
     def test_ExtractFiles(self):
         file = pathlib.Path("test/test_source/sample.pdf")
         extractor = pdf.ExtractFiles()
-        extractor.run([file], 5)
+        results = extractor.run([file, "test/test_source/sample-corrupt.pdf"], 5, 2)
         self.assertTrue(file.with_suffix(".txt").exists())
+        self.assertListEqual([x["extracted"] for x in results], [True, False])
         file.with_suffix(".txt").unlink()
 
 
@@ -1,12 +1,18 @@
 import json
 import pathlib
+import tempfile
+import threading
 import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pandas as pd
 
 from corpusama.database.database import Database
-from corpusama.source.reliefweb import ReliefWeb
+from corpusama.source.reliefweb import ReliefWeb, _pdf_rows
+from corpusama.testing import synthetic
+from corpusama.testing.stand_in import StandIn, match
+from corpusama.util import io as _io
 from corpusama.util import util
 
 config_file = "test/config-example.yml"
@@ -59,6 +65,23 @@ class Test_ReliefWeb(unittest.TestCase):
         self.job._offset()
         self.assertEqual(self.job.config.get("parameters").get("offset"), 10)
 
+    def test_pdf_rows(self):
+        df = synthetic.raw_df(50, max_files=3)
+        df["file"] = [[]] + df["file"].to_list()[1:]
+        df = self.db._add_missing_columns(df, "_raw")
+        rows = _pdf_rows(df)
+        expected = [
+            (int(x["id"]), f["id"])
+            for x in synthetic.records(50, max_files=3)[1:]
+            for f in x["fields"].get("file", [])
+        ]
+        self.assertEqual(list(zip(rows["id"], rows["file_id"])), expected)
+        self.assertTrue(set(self.db.tables["_pdf"]).issubset(rows.columns))
+        self.job.df_raw = df
+        self.job._insert_pdf()
+        res = self.db.c.execute("SELECT id, file_id FROM _pdf ORDER BY rowid")
+        self.assertEqual(res.fetchall(), expected)
+
     @unittest.skip("Disabled due to loss of example files: TODO regenerate them.")
     def test_inserted_values_match_source(self):
         """Tests that API data has identical columns before and after insertion.
@@ -90,6 +113,335 @@ class Test_ReliefWeb(unittest.TestCase):
         )
 
 
+class _PDFHandler(BaseHTTPRequestHandler):
+    """Serves `sample.pdf` (404 for `/missing*`, 503 for `/busy*` while `busy`)."""
+
+    with open("test/test_source/sample.pdf", "rb") as f:
+        body = f.read()
+    requests = []
+    busy = False
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        status = None
+        if self.path.startswith("/missing"):
+            status = 404
+        elif self.path.startswith("/busy") and self.busy:
+            status = 503
+        if status:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Test_ReliefWeb_Manifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = synthetic.config(self.tmp.name)
+        self.db = Database(config)
+        self.job = ReliefWeb(config, self.db)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _PDFHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{self.server.server_port}"
+        df = pd.DataFrame({"id": [1, 1, 2], "file_id": [10, 11, 20]})
+        df["url"] = url + "/" + df["file_id"].astype(str) + ".pdf"
+        df["filename"] = df["file_id"].astype(str) + ".pdf"
+        df["filesize"] = len(_PDFHandler.body)
+        df["mimetype"] = "application/pdf"
+        self.db.insert(self.db._add_missing_columns(df, "_pdf"), "_pdf")
+        _PDFHandler.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.close_db()
+        self.tmp.cleanup()
+
+    def manifest(self) -> pd.DataFrame:
+        return pd.read_sql("SELECT * FROM _manifest ORDER BY file_id", self.db.conn)
+
+    def test_get_and_extract_pdfs(self):
+        self.assertEqual(self.job.get_pdfs(wait=0), [])
+        manifest = self.manifest()
+        self.assertEqual(len(manifest), 3)
+        self.assertTrue(manifest["sha256"].notna().all())
+        self.assertTrue(manifest["extracted_at"].isna().all())
+        # unchanged files are skipped
+        self.job.get_pdfs(wait=0.01)
+        self.assertEqual(len(_PDFHandler.requests), 3)
+        self.job.extract_pdfs(cores=2)
+        manifest = self.manifest()
+        self.assertTrue(manifest["extracted_at"].notna().all())
+        txt = pathlib.Path(self.tmp.name) / "pdf" / "1" / "10.txt"
+        self.assertTrue(txt.exists())
+        mtime = txt.stat().st_mtime_ns
+        self.job.extract_pdfs(cores=2)
+        self.assertEqual(txt.stat().st_mtime_ns, mtime)
+        # a changed size triggers a new download, and new content an extraction
+        self.db.c.execute(
+            "UPDATE _manifest SET size = 1, sha256 = 'x' WHERE file_id = 20"
+        )
+        self.job.get_pdfs(wait=0.01)
+        self.assertEqual(_PDFHandler.requests[3:], ["/20.pdf"])
+        manifest = self.manifest()
+        self.assertListEqual(manifest["extracted_at"].isna().tolist(), [0, 0, 1])
+
+    def test_get_pdfs_refresh(self):
+        self.job.get_pdfs(wait=0.01)
+        self.job.extract_pdfs(cores=1)
+        manifest = self.manifest()
+        self.assertTrue((manifest["etag"] == '"v1"').all())
+        # unchanged files return 304
+        self.job.get_pdfs(wait=0.01, refresh=True)
+        self.assertEqual(len(_PDFHandler.requests), 6)
+        pd.testing.assert_frame_equal(self.manifest(), manifest)
+        # same content with a new ETag doesn't need extracting again
+        self.db.c.execute("""UPDATE _manifest SET etag = '"v0"' WHERE file_id = 10""")
+        self.db.conn.commit()
+        self.job.get_pdfs(wait=0.01, refresh=True)
+        self.assertEqual(len(_PDFHandler.requests), 9)
+        pd.testing.assert_frame_equal(self.manifest(), manifest)
+
+    def test_backfill_manifest(self):
+        self.job.get_pdfs(wait=0.01)
+        self.job.extract_pdfs(cores=1)
+        (pathlib.Path(self.tmp.name) / "pdf" / "2" / "20.pdf").unlink()
+        self.db.c.execute(
+            """INSERT INTO _lang (id, file_id, lang_date)
+            VALUES (1, 10, '2024-01-01'), (2, 20, '2024-01-01')"""
+        )
+        self.db.c.execute("DELETE FROM _manifest")
+        self.job._backfill_manifest()
+        manifest = self.manifest()
+        self.assertEqual(len(manifest), 3)
+        self.assertListEqual(manifest["extracted_at"].isna().tolist(), [0, 0, 1])
+        self.assertListEqual(manifest["downloaded_at"].isna().tolist(), [0, 0, 1])
+        self.assertTrue(manifest["sha256"].isna().all())
+        res = self.db.c.execute("SELECT lid_source FROM _lang ORDER BY file_id")
+        self.assertEqual(res.fetchall(), [(manifest["extracted_at"][0],), (None,)])
+        # only the missing file is downloaded
+        self.assertEqual(self.job.get_pdfs(wait=0), [])
+        self.assertEqual(_PDFHandler.requests[3:], ["/20.pdf"])
+
+    def test_backfill_manifest_packed(self):
+        self.job.config["text_store"] = {"packed": True}
+        self.job.get_pdfs(wait=0)
+        self.job.extract_pdfs(cores=1)
+        self.assertFalse(list(pathlib.Path(self.tmp.name).glob("pdf/*/*.txt")))
+        self.db.c.execute("DELETE FROM _manifest")
+        self.job._backfill_manifest()
+        manifest = self.manifest()
+        self.assertTrue(manifest["extracted_at"].notna().all())
+        # not extracted again
+        self.job.extract_pdfs(cores=1)
+        pd.testing.assert_frame_equal(self.manifest(), manifest)
+
+    def test_get_pdfs_failed(self):
+        url = self.db.c.execute("SELECT url FROM _pdf WHERE file_id = 20")
+        url = url.fetchone()[0].replace("/20.pdf", "/missing.pdf")
+        self.db.c.execute("UPDATE _pdf SET url = ? WHERE file_id = 20", (url,))
+        self.assertEqual(self.job.get_pdfs(wait=0), [url])
+        manifest = self.manifest()
+        self.assertEqual(manifest["error"].tolist(), [None, None, "404"])
+        self.assertTrue(manifest["failed_at"][2])
+        self.assertIsNone(manifest["downloaded_at"][2])
+        # not tried again, unless refreshing
+        self.assertEqual(self.job.get_pdfs(wait=0), [])
+        self.assertEqual(len(_PDFHandler.requests), 3)
+        self.assertEqual(self.job.get_pdfs(wait=0, refresh=True), [url])
+        self.assertEqual(_PDFHandler.requests.count("/missing.pdf"), 2)
+
+    def test_get_pdfs_transient(self):
+        url = self.db.c.execute("SELECT url FROM _pdf WHERE file_id = 20")
+        url = url.fetchone()[0].replace("/20.pdf", "/busy.pdf")
+        self.db.c.execute("UPDATE _pdf SET url = ? WHERE file_id = 20", (url,))
+        _PDFHandler.busy = True
+        self.addCleanup(setattr, _PDFHandler, "busy", False)
+        self.assertEqual(self.job.get_pdfs(wait=0, retries=0), [url])
+        manifest = self.manifest()
+        self.assertIn("503", manifest["error"][2])
+        self.assertIsNone(manifest["downloaded_at"][2])
+        # retried on the next run
+        _PDFHandler.busy = False
+        self.assertEqual(self.job.get_pdfs(wait=0), [])
+        manifest = self.manifest()
+        self.assertIsNone(manifest["error"][2])
+        self.assertIsNone(manifest["failed_at"][2])
+        self.assertTrue(manifest["downloaded_at"][2])
+
+
+class Test_ReliefWeb_Harvest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.stand_in = StandIn(250, paragraphs=1, pdf_size=2000)
+        self.url = self.stand_in.start()
+        self.params = {"limit": 100, "offset": 0, "sort": ["date.changed:asc"]}
+
+    def tearDown(self):
+        self.stand_in.stop()
+        self.tmp.cleanup()
+
+    def harvest(
+        self,
+        name: str,
+        prefetch: bool,
+        calls_made: int = 0,
+        new: bool = False,
+        **kwargs,
+    ) -> ReliefWeb:
+        directory = pathlib.Path(self.tmp.name) / name
+        directory.mkdir(exist_ok=True)
+        kwargs = {"parameters": self.params} | kwargs
+        config = synthetic.config(directory, url=self.url, **kwargs)
+        job = ReliefWeb(config, Database(config))
+        day = pd.Timestamp.now(tz="UTC").date().isoformat()
+        job.db.c.execute(
+            "INSERT OR IGNORE INTO _quota VALUES ('reliefweb', ?, ?)",
+            (day, calls_made),
+        )
+        job._set_wait = lambda manual=None: setattr(job, "wait", 0.2)
+        if new:
+            job.get_new_records(prefetch=prefetch)
+        else:
+            job.get_all_records(prefetch=prefetch)
+        return job
+
+    def test_prefetch_matches_serial(self):
+        jobs = [self.harvest("serial", False), self.harvest("prefetch", True)]
+        dbs = [x.db for x in jobs]
+        queries = [
+            "SELECT id, api_params_hash FROM _raw ORDER BY id",
+            "SELECT id, file_id FROM _pdf ORDER BY id, file_id",
+            "SELECT api_params_hash, api_params, count FROM _log ORDER BY count",
+        ]
+        for q in queries:
+            serial, prefetch = [pd.read_sql(q, x.conn) for x in dbs]
+            pd.testing.assert_frame_equal(serial, prefetch)
+        self.assertEqual(len(serial), 3)
+        offsets = [x[2] for x in self.stand_in.requests]
+        self.assertEqual(offsets, [0, 100, 200, 250] * 2)
+        times = [x[0] for x in self.stand_in.requests[4:]]
+        self.assertTrue(all(y - x >= 0.2 for x, y in zip(times, times[1:])))
+        for db in dbs:
+            db.close_db()
+
+    def test_quota(self):
+        job = self.harvest("serial", False, calls_made=997)
+        self.assertEqual(len(self.stand_in.requests), 3)
+        status = job.quota_status()
+        self.assertEqual(status["calls_made"], 1000)
+        self.assertEqual(status["calls_remaining"], 0)
+        reset = pd.Timestamp(status["reset"])
+        self.assertEqual(
+            reset, pd.Timestamp.now(tz="UTC").normalize() + pd.Timedelta("1D")
+        )
+        job.db.close_db()
+        job = self.harvest("prefetch", True, calls_made=999)
+        self.assertEqual(len(self.stand_in.requests), 4)
+        job.db.close_db()
+
+    def test_quota_from_log(self):
+        config = synthetic.config(self.tmp.name, url=self.url)
+        job = ReliefWeb(config, Database(config))
+        job._logged_calls = lambda: 5
+        self.assertEqual(job.quota_status()["calls_made"], 5)
+        job._count_call()
+        job._logged_calls = lambda: 7
+        self.assertEqual(job.quota_status()["calls_made"], 6)
+        db, job.db = job.db, None
+        job._count_call()
+        self.assertEqual(job.quota_status()["calls_made"], 7)
+        db.close_db()
+
+    def test_quota_rollback(self):
+        config = synthetic.config(self.tmp.name, url=self.url)
+        job = ReliefWeb(config, Database(config))
+        df = job.db._add_missing_columns(synthetic.raw_df(1), "_raw")
+        with self.assertRaises(ValueError):
+            with job.db.transaction():
+                job.db.insert(df, "_raw")
+                job._count_call()
+                job._count_call()
+                raise ValueError
+        # calls made are counted, other writes rolled back
+        self.assertEqual(job.quota_status()["calls_made"], 2)
+        n = job.db.c.execute("SELECT COUNT(*) FROM _raw").fetchone()[0]
+        self.assertEqual(n, 0)
+        job.db.close_db()
+
+    def test_record_replay(self):
+        cache = {"dir": f"{self.tmp.name}/cache", "mode": "record"}
+        recorded = self.harvest("record", False, api_cache=cache)
+        self.stand_in.stop()
+        cache |= {"mode": "replay", "timing": 0}
+        replayed = self.harvest("replay", True, api_cache=cache)
+        self.assertEqual(len(self.stand_in.requests), 4)
+        self.assertEqual(replayed.quota_status()["calls_made"], 0)
+        q = "SELECT * FROM _raw ORDER BY id"
+        pd.testing.assert_frame_equal(
+            pd.read_sql(q, recorded.db.conn), pd.read_sql(q, replayed.db.conn)
+        )
+        for job in [recorded, replayed]:
+            job.db.close_db()
+
+    def test_high_water_mark(self):
+        job = self.harvest("new", False, new=True)
+        latest = max(x["date"]["changed"] for x in self.stand_in.index)
+        self.assertEqual(job._high_water_mark(), latest)
+        res = job.db.c.execute("SELECT params, date_changed FROM _harvest").fetchall()
+        self.assertEqual(len(res), 1)
+        self.assertNotIn("offset", json.loads(res[0][0]))
+        # the mark kept for these parameters
+        job.db.c.execute("UPDATE _harvest SET date_changed = '2000-01-01'")
+        self.assertEqual(job._high_water_mark(), "2000-01-01")
+        # parameters without `_harvest` rows use `_raw`
+        params_old = job.params_old
+        job.params_old = params_old | {"filter": {"field": "language", "value": 267}}
+        self.assertEqual(job._high_water_mark(), latest)
+        job.db.c.execute("DELETE FROM _harvest")
+        job.params_old = params_old
+        self.assertEqual(job._high_water_mark(), latest)
+        job.db.close_db()
+
+    def test_new_records_and_pdfs(self):
+        params = _io.load_yaml(config_file)["parameters"]
+        expected = [x["id"] for x in self.stand_in.index if match(x, params["filter"])]
+        self.assertTrue(0 < len(expected) < len(self.stand_in.index))
+        job = self.harvest("new", True, new=True, parameters=params)
+        ids = pd.read_sql("SELECT id FROM _raw ORDER BY id", job.db.conn)["id"]
+        self.assertEqual(ids.to_list(), expected)
+        job.db.close_db()
+        # continues from the latest `date.changed`
+        n_requests = len(self.stand_in.requests)
+        job = self.harvest("new", True, new=True, parameters=params)
+        self.assertEqual(len(self.stand_in.requests) - n_requests, 2)
+        self.assertEqual(
+            job.db.c.execute("SELECT COUNT(*) FROM _raw").fetchone()[0], len(expected)
+        )
+        # downloads each file, then gets 304 responses
+        self.assertEqual(job.get_pdfs(wait=0.001), [])
+        sizes = pd.read_sql("SELECT size FROM _manifest", job.db.conn)["size"]
+        n_files = job.db.c.execute("SELECT COUNT(*) FROM _pdf").fetchone()[0]
+        self.assertEqual(sizes.to_list(), [2000] * n_files)
+        n_requests = len(self.stand_in.requests)
+        self.assertEqual(job.get_pdfs(wait=0.001, refresh=True), [])
+        self.assertEqual(len(self.stand_in.requests) - n_requests, n_files)
+        job.db.close_db()
+
+
 @unittest.skip("run API calls manually")
 class Test_ReliefWeb_Making_Calls(unittest.TestCase):
     """Superficially tests that API calls function properly."""
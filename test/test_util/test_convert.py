@@ -45,6 +45,14 @@ class Test_Convert(unittest.TestCase):
         )
         self.assertEqual(list(df_clean.a[4:]), [None] * 6)
 
+    def test_to_sql_values(self):
+        self.assertEqual(convert.to_sql_values(pd.Series([1, 2])), [1, 2])
+        self.assertEqual(convert.to_sql_values(pd.Series([1.5, np.nan])), [1.5, None])
+        series = pd.Series([" a ", "None", {"b": 1}, np.int64(3), b"x", pd.NaT])
+        self.assertEqual(
+            convert.to_sql_values(series), ["a", None, '{"b": 1}', 3, b"x", None]
+        )
+
     def test_empty_list_to_none(self):
         self.assertIsInstance(convert.empty_list_to_none([1, 2, 3]), list)
         self.assertIsNone(convert.empty_list_to_none([""]))
@@ -1,3 +1,4 @@
+import os
 import time
 import unittest
 from multiprocessing import cpu_count
@@ -29,6 +30,22 @@ def slow_func(wait):
     return wait
 
 
+def os_getpid(ls):
+    """Returns the process id of the worker."""
+    return os.getpid()
+
+
+def init_worker(value):
+    """A test initializer for ``test_executor_initializer``."""
+    global worker_value
+    worker_value = value
+
+
+def ls_worker_value(ls):
+    """Returns the value set by ``init_worker`` for each item."""
+    return [worker_value for x in ls]
+
+
 class Test_Parallel(unittest.TestCase):
     def test_set_cores(self):
         self.assertEqual(parallel.set_cores(2), 2)
@@ -57,6 +74,100 @@ class Test_Parallel(unittest.TestCase):
         ls2 = parallel.run(ls.copy(), ls_func, cores)
         self.assertListEqual(ls1, ls2)
 
+    def test_executor_reused(self):
+        """Ensures an executor gives the same results as ``run`` over many calls."""
+        df = pd.DataFrame(
+            np.random.randint(100000, 1000000, size=(100, 3)), columns=list("ABC")
+        )
+        with parallel.Executor(2) as executor:
+            pids = set()
+            for x in range(3):
+                self.assertTrue(
+                    df_func(df.copy()).equals(executor.run(df.copy(), df_func))
+                )
+                pids.update([p.pid for p in executor.pool._pool])
+            self.assertEqual(len(pids), 2)
+            ls = list(range(10))
+            self.assertListEqual(executor.run(ls, ls_func), ls_func(ls))
+        with self.assertRaises(ValueError):
+            executor.run(ls, ls_func)
+
+    def test_executor_initializer(self):
+        with parallel.Executor(2, "spawn", init_worker, ("ready",)) as executor:
+            self.assertEqual(executor.run([1, 2, 3], ls_worker_value), ["ready"] * 3)
+
+    def test_executor_lazy(self):
+        with parallel.Executor(2, "spawn") as executor:
+            self.assertEqual(executor.run([], ls_func), [])
+            self.assertTrue(executor.run(pd.DataFrame(), df_func).empty)
+            self.assertIsNone(executor.pool)
+            self.assertEqual(executor.run([1, 2], ls_func), ls_func([1, 2]))
+            self.assertEqual(executor.pool._ctx.get_start_method(), "spawn")
+        self.assertIsNone(executor.pool)
+        with self.assertRaises(ValueError):
+            executor.run([1], ls_func)
+
+    def test_use_executor(self):
+        with parallel.Executor(2) as executor:
+            with parallel.use_executor(executor) as reused:
+                self.assertIs(reused, executor)
+            self.assertFalse(executor.closed)
+        with parallel.use_executor(None, 2) as new:
+            self.assertEqual(new.cores, 2)
+        self.assertIsNone(new.pool)
+
+    def test_pipeline(self):
+        written = []
+        chunks = [list(range(x, x + 5)) for x in range(0, 50, 5)]
+        timings = parallel.pipeline(
+            iter(chunks),
+            lambda x: None if x[0] == 10 else ls_func(x),
+            written.append,
+            read_depth=1,
+            write_depth=1,
+        )
+        expected = [ls_func(x) for x in chunks if x[0] != 10]
+        self.assertListEqual(written, expected)
+        self.assertEqual(timings["chunks"], 10)
+        for stage in ["read", "process", "write", "wait", "total"]:
+            self.assertIn(stage, timings)
+
+    def test_pipeline_raises(self):
+        def _write(x):
+            raise RuntimeError("write")
+
+        def _read():
+            yield [1]
+            raise RuntimeError("read")
+
+        ls = [[x] for x in range(10)]
+        with self.assertRaisesRegex(RuntimeError, "write"):
+            parallel.pipeline(iter(ls), ls_func, _write)
+        with self.assertRaisesRegex(RuntimeError, "read"):
+            parallel.pipeline(_read(), ls_func, lambda x: None)
+        with self.assertRaises(ZeroDivisionError):
+            parallel.pipeline(iter(ls), lambda x: 1 / 0, lambda x: None)
+
+    def test_run_with_timeouts(self):
+        args = [(0.1,), (10,), (0.1,), (0.2,), ("a",)]
+        t0 = time.perf_counter()
+        results = list(parallel.run_with_timeouts(slow_func, args, 2, timeout=1))
+        t1 = time.perf_counter()
+        self.assertLess(t1 - t0, 5)
+        results = {x[0]: x[1] for x in results}
+        self.assertDictEqual(results, {0: 0.1, 1: None, 2: 0.1, 3: 0.2, 4: None})
+
+    def test_run_with_timeouts_cores(self):
+        results = list(parallel.run_with_timeouts(abs, [(-1,), (-2,), (-3,)], 0))
+        self.assertEqual(sorted([x[1] for x in results]), [1, 2, 3])
+        self.assertEqual(list(parallel.run_with_timeouts(abs, [], 0)), [])
+
+    def test_run_with_timeouts_reuses_workers(self):
+        args = [([x],) for x in range(20)]
+        results = list(parallel.run_with_timeouts(os_getpid, args, 2))
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(set([x[1] for x in results])), 2)
+
     def test_run_with_timeout_stops(self):
         wait = 10
         timeout = 1
@@ -0,0 +1,54 @@
+import pickle
+import tempfile
+import unittest
+
+from corpusama.util import store
+
+
+class Test_Store(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_files(self):
+        texts = store.TextStore(self.tmp.name)
+        texts.path(1, 10).parent.mkdir()
+        self.assertIsNone(texts.read(1, 10))
+        texts.write(1, 10, "Some text.\n")
+        self.assertTrue(texts.path(1, 10).exists())
+        self.assertEqual(texts.read(1, 10), "Some text.\n")
+        self.assertFalse(texts.exists(1, 11))
+
+    def test_packed(self):
+        self.assertIsNone(store.TextStore(self.tmp.name, True).read(1, 10))
+        for compression in store.compressors:
+            texts = store.TextStore(self.tmp.name, True, compression)
+            texts.write(1, 10, "Some text.\n" * 100)
+            texts.write(1, 10, f"{compression} é\n" * 100)
+            self.assertTrue(texts.exists(1, 10))
+            # readable after pickling (e.g., in worker processes)
+            copy = pickle.loads(pickle.dumps(texts))
+            self.assertEqual(copy.read(1, 10), f"{compression} é\n" * 100)
+            self.assertFalse(texts.path(1, 10).exists())
+            texts.close()
+        with self.assertRaises(ValueError):
+            store.TextStore(self.tmp.name, True, "zip")
+
+    def test_pack_files(self):
+        files = store.TextStore(self.tmp.name)
+        files.path(1, 10).parent.mkdir()
+        files.write(1, 10, "Some text.")
+        packed = store.from_config(
+            {"pdf_dir": self.tmp.name, "text_store": {"packed": True}}
+        )
+        self.assertEqual(packed.pack_files(remove=True), 1)
+        self.assertEqual(packed.read(1, 10), "Some text.")
+        self.assertFalse(files.exists(1, 10))
+        with self.assertRaises(ValueError):
+            files.pack_files()
+
+
+if __name__ == "__main__":
+    unittest.main()